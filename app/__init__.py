@@ -1,28 +1,80 @@
 # init.py
 
-from flask import Flask
+import click
+from flask import Flask, current_app
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
+from app.database import RoutingSession, configure_engines
 from config import Config
 
-db = SQLAlchemy()
-migrate = Migrate()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
+
+class LazyGroup(click.Group):
+    """Группа команд CLI, которая загружает настоящую группу при первом обращении.
+
+    Зависимости команд (alembic, модуль резервных копий) не импортируются при
+    старте веб-процесса, а только когда команда действительно вызывается.
+    """
+
+    def __init__(self, name, load, **kwargs):
+        super().__init__(name, **kwargs)
+        self._load = load
+
+    def get_command(self, ctx, cmd_name):
+        return self._load().get_command(ctx, cmd_name)
+
+    def list_commands(self, ctx):
+        return self._load().list_commands(ctx)
+
+
+def init_migrate(app):
+    """Подключает Flask-Migrate (и alembic) к приложению."""
+    from flask_migrate import Migrate
+
+    if 'migrate' not in app.extensions:
+        Migrate(app, db)
+
+
+def _migrate_commands():
+    from flask_migrate.cli import db as db_commands
+
+    init_migrate(current_app._get_current_object())
+    return db_commands
+
+
+def _backup_commands():
+    from app.backup import backup_cli
+
+    return backup_cli
+
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    configure_engines(app)
     db.init_app(app)
-    migrate.init_app(app, db)
     login_manager.init_app(app)
     login_manager.login_view = 'taskflow.auth'
 
-    from app.models import User
+    from app import identity  # загрузчик пользователя для Flask-Login
+    from app import history  # запись истории изменений задач при коммите
     from app.routes import bp as main_bp
+    from app import assets, database, events, fragments, jobs, notifications, perf, task_import
 
     app.register_blueprint(main_bp)
+    assets.init_app(app)
+    database.init_app(app)
+    events.init_app(app)
+    fragments.init_app(app)
+    jobs.init_app(app)
+    notifications.init_app(app)
+    perf.init_app(app)
+    task_import.init_app(app)
+    app.cli.add_command(LazyGroup('db', _migrate_commands, help='Миграции базы данных (Flask-Migrate).'))
+    app.cli.add_command(LazyGroup('backup', _backup_commands, help='Резервное копирование базы данных.'))
 
     return app
\ No newline at end of file
@@ -0,0 +1,136 @@
+# app/access.py
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, has_app_context
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from app.database import primary
+from app.models import db, Project, ProjectUser
+
+
+class MembershipIndex:
+    """Кэш ролей пользователей в проектах: (user_id, project_id) -> роль.
+
+    Отсутствие участия в существующем проекте тоже кэшируется (роль None).
+    Записи живут не дольше ttl секунд: так изменения, сделанные другими
+    процессами, видны без явного сброса. Изменения в своем процессе сбрасывают
+    записи сразу после коммита. Размер ограничен, старые записи вытесняются (LRU).
+    """
+
+    _missing = object()
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, project_id):
+        key = (user_id, project_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return self._missing
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return self._missing
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, user_id, project_id, role, ttl, max_size):
+        key = (user_id, project_id)
+        with self._lock:
+            self._entries[key] = (role, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys=None):
+        """Сбрасывает переданные пары (user_id, project_id) или весь кэш."""
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+
+
+membership_index = MembershipIndex()
+
+
+def project_role(project_id, user_id=None):
+    """Роль пользователя в проекте или None, если он не участник.
+
+    Ответ берется из кэша запроса, затем из кэша процесса, и только потом
+    одним запросом по первичному ключу project_user.
+    """
+    if user_id is None:
+        user_id = current_user.id
+    key = (user_id, project_id)
+
+    request_cache = g.setdefault('project_roles', {})
+    if key in request_cache:
+        return request_cache[key]
+
+    role = membership_index.get(user_id, project_id)
+    if role is MembershipIndex._missing:
+        # Одним запросом и роль, и существование проекта: для несуществующих
+        # проектов ничего не кэшируем, иначе перебор id раздувал бы кэш
+        # Роль попадает в кэш процесса, поэтому читается с основной базы, а не с реплики
+        with primary():
+            row = db.session.query(Project.id, ProjectUser.role).outerjoin(ProjectUser, db.and_(
+                ProjectUser.project_id == Project.id,
+                ProjectUser.user_id == user_id
+            )).filter(Project.id == project_id).first()
+        role = row.role if row is not None else None
+        if row is not None:
+            membership_index.set(user_id, project_id, role, current_app.config['MEMBERSHIP_CACHE_TTL'],
+                                 current_app.config['MEMBERSHIP_CACHE_SIZE'])
+
+    request_cache[key] = role
+    return role
+
+
+def is_project_member(project_id, user_id=None):
+    return project_role(project_id, user_id) is not None
+
+
+# Сброс кэша при изменении project_user. Ключи копятся в сессии и
+# сбрасываются после коммита, чтобы до него кэш не заполнился старыми данными.
+
+def _remember_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    changes = session.info.setdefault('membership_changes', set())
+    if changes is not None:  # None - кэш будет сброшен целиком
+        changes.add((target.user_id, target.project_id))
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(ProjectUser, _event, _remember_change)
+
+
+@event.listens_for(db.Session, 'do_orm_execute')
+def _remember_bulk_change(orm_execute_state):
+    # Массовые UPDATE/DELETE по project_user не вызывают событий маппера
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is ProjectUser:
+        orm_execute_state.session.info['membership_changes'] = None
+
+
+@event.listens_for(db.Session, 'after_commit')
+def _apply_changes(session):
+    if 'membership_changes' not in session.info:
+        return
+    membership_index.invalidate(session.info.pop('membership_changes'))
+    if has_app_context():
+        g.pop('project_roles', None)
+
+
+@event.listens_for(db.Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('membership_changes', None)
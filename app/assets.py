@@ -0,0 +1,168 @@
+# app/assets.py
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+assets_cli = AppGroup('assets', help='Сборка статических файлов.')
+
+# Собранные файлы лежат в static/dist и ссылаются на исходные через манифест
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_EXTENSIONS = ('.css', '.js')
+# Имя файла меняется вместе с содержимым, поэтому кэшировать его можно навсегда
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Предпочтение при одинаковом качестве в Accept-Encoding
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Строки в кавычках не трогаем: в них бывают data: URI и content
+CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+
+
+def _minify_css_code(code):
+    code = re.sub(r'\s+', ' ', code)
+    # Пробелы вокруг : внутри селекторов значимы (a :hover), поэтому убираем только после
+    code = re.sub(r'\s*([{};,])\s*', r'\1', code)
+    code = re.sub(r':\s+', ':', code)
+    return code.replace(';}', '}')
+
+
+def minify_css(text):
+    """Удаляет комментарии и лишние пробелы, не заходя внутрь строк."""
+    parts = []
+    position = 0
+    for match in CSS_TOKEN_RE.finditer(text):
+        parts.append(_minify_css_code(text[position:match.start()]))
+        if match.group(1):
+            parts.append(match.group(1))
+        position = match.end()
+    parts.append(_minify_css_code(text[position:]))
+    return ''.join(parts).strip()
+
+
+def minify_js(text):
+    """Убирает отступы и пустые строки. Без разбора JS - строки и регулярные выражения не трогаются."""
+    return '\n'.join(line.strip() for line in text.splitlines() if line.strip()) + '\n'
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def build_assets(static_folder):
+    """Собирает static/dist: минифицированные копии с хешем содержимого в имени
+    и рядом сжатые варианты .gz и .br (если установлен пакет brotli).
+
+    Возвращает манифест {исходное имя: имя в dist}.
+    """
+    brotli = _brotli()
+    dist = os.path.join(static_folder, DIST_DIR)
+    partial = dist + '.part'
+    shutil.rmtree(partial, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [name for name in dirs if os.path.join(root, name) not in (dist, partial)]
+        for name in sorted(files):
+            stem, extension = os.path.splitext(name)
+            if extension not in ASSET_EXTENSIONS:
+                continue
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+
+            with open(source, encoding='utf-8') as f:
+                text = f.read()
+            data = (minify_css(text) if extension == '.css' else minify_js(text)).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:12]
+
+            built = f'{os.path.dirname(relative)}/{stem}.{digest}{extension}'.lstrip('/')
+            target = os.path.join(partial, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+
+            manifest[relative] = f'{DIST_DIR}/{built}'
+
+    os.makedirs(partial, exist_ok=True)
+    with open(os.path.join(partial, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    shutil.rmtree(dist, ignore_errors=True)
+    os.replace(partial, dist)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _fingerprint_url(endpoint, values):
+    # url_for('static', filename='styles/main.css') -> /static/dist/styles/main.<хеш>.css
+    if endpoint == 'static' and 'filename' in values:
+        built = current_app.extensions['assets'].get(values['filename'])
+        if built is not None:
+            values['filename'] = built
+
+
+def serve_static(filename):
+    """Статика; собранные файлы - сжатым вариантом по Accept-Encoding и с вечным кэшем."""
+    app = current_app
+    if filename.startswith(DIST_DIR + '/') and filename in app.extensions['assets_built']:
+        mimetype = 'text/css' if filename.endswith('.css') else 'text/javascript'
+        encodings = request.accept_encodings
+        path, encoding = filename, None
+        for name, suffix in sorted(ENCODINGS, key=lambda item: -encodings[item[0]]):
+            if encodings[name] and os.path.exists(os.path.join(app.static_folder, filename + suffix)):
+                path, encoding = filename + suffix, name
+                break
+
+        response = send_from_directory(app.static_folder, path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+    return app.send_static_file(filename)
+
+
+def init_app(app):
+    manifest = load_manifest(app.static_folder)
+    app.extensions['assets'] = manifest
+    app.extensions['assets_built'] = set(manifest.values())
+    app.url_defaults(_fingerprint_url)
+    app.view_functions['static'] = serve_static
+    app.cli.add_command(assets_cli)
+
+
+@assets_cli.command('build')
+def build_command():
+    """Собирает минифицированные и сжатые статические файлы с хешем в имени."""
+    static_folder = current_app.static_folder
+    manifest = build_assets(static_folder)
+    for source, built in sorted(manifest.items()):
+        original = os.path.getsize(os.path.join(static_folder, source))
+        compressed = os.path.getsize(os.path.join(static_folder, built + '.gz'))
+        click.echo(f'{source:<32} {original:>8} -> {os.path.getsize(os.path.join(static_folder, built)):>8} '
+                   f'(gzip {compressed:>6})  {built}')
+    if _brotli() is None:
+        click.echo('Пакет brotli не установлен: варианты .br не созданы', err=True)
+    click.echo(f'Built {len(manifest)} assets; restart the application to pick up the new manifest')
@@ -0,0 +1,587 @@
+# app/backup.py
+import base64
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+
+from app.events import reset_caches
+from app.models import db, Report
+
+logger = logging.getLogger(__name__)
+
+backup_cli = AppGroup('backup', help='Резервное копирование базы данных.')
+
+BACKUP_FORMAT = 'taskflow-backup'
+BACKUP_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+# Сжатие чанков: 6 - компромисс между размером и временем, как у gzip по умолчанию
+BACKUP_COMPRESS_LEVEL = 6
+# Прогресс в строку отчета пишется не чаще раза в столько секунд
+PROGRESS_INTERVAL = 1.0
+
+SNAPSHOT_ID_RE = re.compile(r'^[0-9A-Fa-f-]+$')
+
+
+def _encode_value(value):
+    """Значения, которых нет в JSON; restore приводит их обратно по типу колонки."""
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    raise TypeError(f'Значение {type(value).__name__} не сериализуется')
+
+
+class _HashingWriter:
+    """Файл, который считает sha256 и размер записанных (сжатых) байтов."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+class BackupProgress:
+    """Общий счетчик выгруженных строк; процент пишется в report.progress."""
+
+    def __init__(self, engine, report_id, total_rows):
+        self.engine = engine
+        self.report_id = report_id
+        self.total_rows = max(total_rows, 1)
+        self.done_rows = 0
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    @property
+    def percent(self):
+        # 100 выставляется только после записи манифеста
+        return min(99, self.done_rows * 100 // self.total_rows)
+
+    def advance(self, rows):
+        with self._lock:
+            self.done_rows += rows
+            now = time.monotonic()
+            if now - self._saved_at < PROGRESS_INTERVAL:
+                return
+            self._saved_at = now
+            percent = self.percent
+        self.save(percent)
+
+    def save(self, percent):
+        if self.report_id is None:
+            return
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(db.update(Report).where(Report.id == self.report_id).values(progress=percent))
+        except DBAPIError as e:
+            # SQLite без WAL может не дать записать, пока идут чтения - это не повод прерывать копию
+            logger.warning('Не удалось обновить прогресс резервной копии %s: %s', self.report_id, e)
+
+
+def _begin_snapshot(connection, snapshot_id):
+    """Все потоки PostgreSQL читают один снимок, как pg_dump --jobs."""
+    if snapshot_id is None:
+        return
+    if not SNAPSHOT_ID_RE.match(snapshot_id):
+        raise ValueError(f'Некорректный идентификатор снимка: {snapshot_id}')
+    # SET TRANSACTION SNAPSHOT не принимает параметры запроса
+    connection.exec_driver_sql(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'")
+
+
+def _row_estimates(connection, tables):
+    """Число строк для прогресса: в PostgreSQL - оценка планировщика, иначе count(*)."""
+    if connection.dialect.name == 'postgresql':
+        rows = connection.execute(
+            db.text('SELECT relname, reltuples FROM pg_class WHERE relkind = \'r\' AND relname = ANY(:names)'),
+            {'names': [table.name for table in tables]}
+        ).all()
+        estimates = {name: int(count) for name, count in rows if count >= 0}
+        if len(estimates) == len(tables):
+            return estimates
+    return {
+        table.name: connection.execute(db.select(db.func.count()).select_from(table)).scalar()
+        for table in tables
+    }
+
+
+def _schema_revision(connection):
+    # Проверяем таблицу заранее: ошибка запроса прервала бы транзакцию со снимком
+    if not db.inspect(connection).has_table('alembic_version'):
+        return None
+    return connection.exec_driver_sql('SELECT version_num FROM alembic_version').scalar()
+
+
+def dump_table(engine, table, directory, chunk_rows, progress, snapshot_id=None):
+    """Выгружает таблицу в чанки <таблица>/NNNNN.ndjson.gz через серверный курсор.
+
+    Строка чанка - JSON-массив значений в порядке колонок из манифеста.
+    Возвращает описание таблицы для манифеста.
+    """
+    columns = [column.name for column in table.columns]
+    table_dir = os.path.join(directory, table.name)
+    os.makedirs(table_dir, exist_ok=True)
+
+    chunks = []
+    total = 0
+    isolation = 'REPEATABLE READ' if snapshot_id else None
+    with engine.connect() as connection:
+        if isolation:
+            connection = connection.execution_options(isolation_level=isolation)
+        with connection.begin():
+            _begin_snapshot(connection, snapshot_id)
+            query = db.select(table).order_by(*table.primary_key.columns)
+            result = connection.execution_options(yield_per=chunk_rows).execute(query)
+            for number, rows in enumerate(result.partitions(), start=1):
+                filename = f'{number:05d}.ndjson.gz'
+                with open(os.path.join(table_dir, filename), 'wb') as raw:
+                    writer = _HashingWriter(raw)
+                    with gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=BACKUP_COMPRESS_LEVEL, mtime=0) as f:
+                        for row in rows:
+                            f.write(json.dumps(list(row), ensure_ascii=False, separators=(',', ':'),
+                                               default=_encode_value).encode('utf-8'))
+                            f.write(b'\n')
+                chunks.append({
+                    'file': f'{table.name}/{filename}',
+                    'rows': len(rows),
+                    'bytes': writer.size,
+                    'sha256': writer.sha256.hexdigest()
+                })
+                total += len(rows)
+                progress.advance(len(rows))
+
+    return {'name': table.name, 'columns': columns, 'rows': total, 'chunks': chunks}
+
+
+def _sqlite_snapshot(engine, path):
+    """Копирует базу SQLite в файл path через online backup API; возвращает движок копии."""
+    import sqlite3
+
+    source = engine.raw_connection()
+    try:
+        target = sqlite3.connect(path)
+        try:
+            source.dbapi_connection.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return create_engine(f'sqlite:///{path}')
+
+
+def create_backup(target_dir, workers=None, chunk_rows=None, report_id=None):
+    """Создает логическую резервную копию всех таблиц моделей в каталоге target_dir.
+
+    Таблицы выгружаются параллельно в потоках, каждая своим соединением, из
+    одного снимка: в PostgreSQL - экспортированного, в SQLite - копии файла базы.
+    Копия собирается в target_dir + '.part' и переименовывается после записи
+    манифеста, так что прерванная копия не выглядит готовой. Возвращает манифест.
+    """
+    workers = workers or current_app.config['BACKUP_WORKERS']
+    chunk_rows = chunk_rows or current_app.config['BACKUP_CHUNK_ROWS']
+    engine = db.engine
+    tables = db.metadata.sorted_tables
+
+    if os.path.exists(target_dir):
+        raise FileExistsError(f'Каталог {target_dir} уже существует')
+    partial_dir = target_dir + '.part'
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+
+    started = time.perf_counter()
+    source = engine
+    snapshot_path = partial_dir + '.sqlite'
+    try:
+        if engine.dialect.name == 'sqlite':
+            # У SQLite нет общих снимков между соединениями - потоки читают копию базы
+            source = _sqlite_snapshot(engine, snapshot_path)
+        with source.connect() as coordinator:
+            snapshot_id = None
+            if engine.dialect.name == 'postgresql':
+                # Транзакция координатора держит экспортированный снимок до конца выгрузки
+                coordinator = coordinator.execution_options(isolation_level='REPEATABLE READ')
+                coordinator.begin()
+                snapshot_id = coordinator.exec_driver_sql('SELECT pg_export_snapshot()').scalar()
+
+            estimates = _row_estimates(coordinator, tables)
+            schema_revision = _schema_revision(coordinator)
+            if snapshot_id is None:
+                # Без снимка координатору незачем держать чтение открытым
+                coordinator.rollback()
+            progress = BackupProgress(engine, report_id, sum(estimates.values()))
+            progress.save(0)
+
+            # Большие таблицы первыми: меньше простоя потоков в конце
+            order = sorted(tables, key=lambda table: estimates.get(table.name, 0), reverse=True)
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='backup') as executor:
+                futures = {
+                    table.name: executor.submit(dump_table, source, table, partial_dir, chunk_rows,
+                                                progress, snapshot_id)
+                    for table in order
+                }
+                dumped = {name: future.result() for name, future in futures.items()}
+
+        manifest = {
+            'format': BACKUP_FORMAT,
+            'version': BACKUP_FORMAT_VERSION,
+            'created_at': datetime.utcnow().isoformat(),
+            'dialect': engine.dialect.name,
+            'schema_revision': schema_revision,
+            'compression': 'gzip',
+            # Порядок таблиц - порядок зависимостей по внешним ключам, в нем же идет восстановление
+            'tables': [dumped[table.name] for table in tables]
+        }
+        with open(os.path.join(partial_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(partial_dir, target_dir)
+    except BaseException:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        raise
+    finally:
+        if source is not engine:
+            source.dispose()
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+    progress.save(100)
+    logger.info('Backup %s: %s rows in %.1fs', target_dir, progress.done_rows, time.perf_counter() - started)
+    return manifest
+
+
+def backup_root():
+    """Каталог копий по умолчанию: BACKUP_DIR или instance/backups."""
+    return current_app.config['BACKUP_DIR'] or os.path.join(current_app.instance_path, 'backups')
+
+
+def backup_path(name, directory=None):
+    """Каталог новой копии: <каталог>/<имя>_<дата>."""
+    return os.path.join(directory or backup_root(), f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+
+def run_backup_report(report):
+    """Выполняет резервную копию из очереди отчетов; возвращает путь к каталогу копии."""
+    parameters = report.parameters or {}
+    target_dir = backup_path(parameters.get('name') or 'taskflow', parameters.get('path'))
+    create_backup(target_dir, report_id=report.id)
+    return target_dir
+
+
+class BackupError(ValueError):
+    """Копия повреждена или не подходит к текущей схеме базы."""
+
+
+def read_manifest(source_dir):
+    path = os.path.join(source_dir, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise BackupError(f'В каталоге {source_dir} нет {MANIFEST_NAME}')
+    except ValueError as e:
+        raise BackupError(f'Некорректный манифест: {e}')
+    if manifest.get('format') != BACKUP_FORMAT or manifest.get('version') != BACKUP_FORMAT_VERSION:
+        raise BackupError('Неизвестный формат резервной копии')
+    return manifest
+
+
+def list_backups(directory=None):
+    """Готовые копии в каталоге, новые сверху."""
+    directory = directory or backup_root()
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith('.part') or not os.path.isdir(path):
+            continue
+        try:
+            manifest = read_manifest(path)
+        except BackupError:
+            continue
+        backups.append({
+            'name': name,
+            'path': path,
+            'created_at': manifest['created_at'],
+            'rows': sum(table['rows'] for table in manifest['tables'])
+        })
+    backups.sort(key=lambda backup: backup['created_at'], reverse=True)
+    return backups
+
+
+def verify_backup(source_dir, manifest):
+    """Сверяет размер и sha256 каждого чанка с манифестом до изменения базы."""
+    for table in manifest['tables']:
+        for chunk in table['chunks']:
+            sha256 = hashlib.sha256()
+            size = 0
+            try:
+                with open(os.path.join(source_dir, chunk['file']), 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        sha256.update(block)
+                        size += len(block)
+            except FileNotFoundError:
+                raise BackupError(f'Нет файла {chunk["file"]}')
+            if size != chunk['bytes'] or sha256.hexdigest() != chunk['sha256']:
+                raise BackupError(f'Файл {chunk["file"]} поврежден: контрольная сумма не совпадает')
+
+
+def _read_chunk(source_dir, chunk):
+    with gzip.open(os.path.join(source_dir, chunk['file']), 'rb') as f:
+        return [json.loads(line) for line in f]
+
+
+def _column_decoder(column):
+    """Обратное к _encode_value преобразование для вставки через SQLAlchemy."""
+    if isinstance(column.type, db.DateTime):
+        return datetime.fromisoformat
+    if isinstance(column.type, db.Date):
+        return date.fromisoformat
+    if isinstance(column.type, db.Time):
+        return dt_time.fromisoformat
+    if isinstance(column.type, db.Numeric) and not isinstance(column.type, db.Float):
+        return Decimal
+    if isinstance(column.type, db.LargeBinary):
+        return base64.b64decode
+    return None
+
+
+def _insert_rows(connection, table, columns, rows):
+    decoders = [(index, _column_decoder(table.c[name])) for index, name in enumerate(columns)]
+    decoders = [(index, decode) for index, decode in decoders if decode is not None]
+    records = []
+    for row in rows:
+        for index, decode in decoders:
+            if row[index] is not None:
+                row[index] = decode(row[index])
+        records.append(dict(zip(columns, row)))
+    if records:
+        connection.execute(table.insert(), records)
+
+
+def _copy_kind(column):
+    if isinstance(column.type, db.JSON):
+        return 'json'
+    if isinstance(column.type, db.LargeBinary):
+        return 'binary'
+    return None
+
+
+def _copy_value(value, kind):
+    """Значение в текстовом формате COPY: \\N для NULL, спецсимволы экранируются."""
+    if value is None:
+        return '\\N'
+    if kind == 'json':
+        value = json.dumps(value, ensure_ascii=False)
+    elif kind == 'binary':
+        value = '\\x' + base64.b64decode(value).hex()
+    elif isinstance(value, bool):
+        return 't' if value else 'f'
+    else:
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_rows(connection, table, columns, rows):
+    preparer = connection.dialect.identifier_preparer
+    kinds = [_copy_kind(table.c[name]) for name in columns]
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value, kind) for value, kind in zip(row, kinds)))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    sql = f'COPY {preparer.format_table(table)} ({", ".join(preparer.quote(name) for name in columns)}) FROM STDIN'
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(sql, buffer)  # psycopg2
+        else:
+            with cursor.copy(sql) as copy:  # psycopg 3
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+def _drop_indexes(connection, table_names):
+    """Удаляет вторичные индексы таблиц и возвращает DDL для их пересоздания.
+
+    Индексы первичных ключей и ограничений остаются. Строить индекс один раз
+    после загрузки быстрее, чем обновлять его на каждой вставке.
+    """
+    if connection.dialect.name == 'postgresql':
+        rows = connection.execute(db.text(
+            'SELECT indexname, indexdef FROM pg_indexes '
+            'WHERE schemaname = current_schema() AND tablename = ANY(:names) '
+            'AND indexname NOT IN (SELECT conname FROM pg_constraint)'
+        ), {'names': list(table_names)}).all()
+    else:
+        rows = connection.execute(db.text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            "AND tbl_name IN :names"
+        ).bindparams(db.bindparam('names', expanding=True)), {'names': list(table_names)}).all()
+
+    preparer = connection.dialect.identifier_preparer
+    for name, _ in rows:
+        connection.exec_driver_sql(f'DROP INDEX {preparer.quote(name)}')
+    return [ddl for _, ddl in rows]
+
+
+def _reset_sequences(connection, tables):
+    """После загрузки с явными id счетчики PostgreSQL продолжают с max(id) + 1."""
+    preparer = connection.dialect.identifier_preparer
+    for table in tables:
+        primary_key = list(table.primary_key.columns)
+        if len(primary_key) != 1 or not isinstance(primary_key[0].type, db.Integer):
+            continue
+        column = preparer.quote(primary_key[0].name)
+        connection.execute(db.text(
+            f'SELECT setval(pg_get_serial_sequence(:table, :column), COALESCE(MAX({column}), 1), '
+            f'MAX({column}) IS NOT NULL) FROM {preparer.format_table(table)}'
+        ), {'table': preparer.format_table(table), 'column': primary_key[0].name})
+
+
+def restore_backup(source_dir, verify=True, keep_report=None, on_table=None):
+    """Заменяет данные всех таблиц моделей содержимым резервной копии.
+
+    Все выполняется одной транзакцией: при ошибке база остается прежней.
+    Таблицы очищаются и загружаются в порядке внешних ключей (PostgreSQL -
+    COPY FROM STDIN, остальные базы - executemany), вторичные индексы
+    пересоздаются после загрузки, счетчики id выставляются по данным.
+    Отчеты, которые в копии ждали или выполнялись, помечаются 'failed' -
+    иначе очередь запустила бы их повторно. keep_report - строка отчета,
+    которая выполняет восстановление: она переживает замену таблицы report,
+    чтобы очередь могла ее завершить.
+    """
+    manifest = read_manifest(source_dir)
+    tables = db.metadata.tables
+    for item in manifest['tables']:
+        table = tables.get(item['name'])
+        if table is None:
+            raise BackupError(f'Таблицы {item["name"]} нет в текущей схеме')
+        unknown = set(item['columns']) - set(table.c.keys())
+        if unknown:
+            raise BackupError(f'В таблице {item["name"]} нет колонок {sorted(unknown)}')
+    if verify:
+        verify_backup(source_dir, manifest)
+
+    engine = db.engine
+    postgres = engine.dialect.name == 'postgresql'
+    order = db.metadata.sorted_tables
+    started = time.perf_counter()
+    total = 0
+
+    with engine.begin() as connection:
+        revision = _schema_revision(connection)
+        if manifest['schema_revision'] and revision and manifest['schema_revision'] != revision:
+            raise BackupError(f'Копия сделана для ревизии схемы {manifest["schema_revision"]}, '
+                              f'база на ревизии {revision}: сначала выполните flask db upgrade/downgrade')
+
+        preparer = connection.dialect.identifier_preparer
+        if postgres:
+            # Построение индексов на большой копии дольше обычного DB_STATEMENT_TIMEOUT
+            connection.exec_driver_sql('SET LOCAL statement_timeout = 0')
+            # Внешние ключи не DEFERRABLE и проверяются на каждой строке: родительские
+            # таблицы загружаются раньше дочерних (порядок manifest - sorted_tables)
+            connection.exec_driver_sql(
+                f'TRUNCATE {", ".join(preparer.format_table(table) for table in order)} RESTART IDENTITY'
+            )
+        else:
+            connection.exec_driver_sql('PRAGMA defer_foreign_keys = ON')
+            for table in reversed(order):
+                connection.execute(table.delete())
+
+        index_ddl = _drop_indexes(connection, [table.name for table in order])
+
+        load = _copy_rows if postgres else _insert_rows
+        for item in manifest['tables']:
+            table = tables[item['name']]
+            for chunk in item['chunks']:
+                load(connection, table, item['columns'], _read_chunk(source_dir, chunk))
+            total += item['rows']
+            if on_table is not None:
+                on_table(item['name'], item['rows'])
+
+        report = tables['report']
+        connection.execute(report.update().where(report.c.status.in_(('pending', 'running'))).values(
+            status='failed', completed_at=datetime.now(),
+            error_message='Прерван восстановлением резервной копии'
+        ))
+        if keep_report is not None:
+            connection.execute(report.delete().where(report.c.id == keep_report['id']))
+            connection.execute(report.insert(), keep_report)
+
+        for ddl in index_ddl:
+            connection.exec_driver_sql(ddl)
+        if postgres:
+            _reset_sequences(connection, order)
+
+    # Кэши всех процессов ссылаются на старые данные
+    reset_caches()
+
+    elapsed = time.perf_counter() - started
+    logger.info('Restored %s: %s rows in %.1fs', source_dir, total, elapsed)
+    return {'tables': len(manifest['tables']), 'rows': total, 'seconds': elapsed}
+
+
+def run_restore_report(report):
+    """Восстанавливает копию из очереди отчетов; возвращает путь к каталогу копии."""
+    source_dir = (report.parameters or {}).get('path')
+    keep_report = {column.name: getattr(report, column.key) for column in Report.__table__.columns}
+    # Открытая транзакция сессии держала бы блокировку на report и мешала очистке таблицы
+    db.session.rollback()
+    restore_backup(source_dir, keep_report=keep_report)
+    return source_dir
+
+
+@backup_cli.command('create')
+@click.option('--dir', 'directory', type=click.Path(file_okay=False), default=None,
+              help='Каталог для копий (по умолчанию BACKUP_DIR или instance/backups).')
+@click.option('--name', default='taskflow', help='Префикс имени копии.')
+@click.option('--workers', type=int, default=None, help='Число потоков выгрузки.')
+@click.option('--chunk-rows', type=int, default=None, help='Строк в одном чанке.')
+def create_command(directory, name, workers, chunk_rows):
+    """Создает резервную копию базы данных."""
+    target_dir = backup_path(name, directory)
+    started = time.perf_counter()
+    manifest = create_backup(target_dir, workers=workers, chunk_rows=chunk_rows)
+    rows = sum(table['rows'] for table in manifest['tables'])
+    click.echo(f'Backup written to {target_dir}: {len(manifest["tables"])} tables, {rows} rows '
+               f'in {time.perf_counter() - started:.1f}s')
+
+
+@backup_cli.command('restore')
+@click.argument('path', type=click.Path(exists=True, file_okay=False))
+@click.option('--no-verify', is_flag=True, help='Не проверять контрольные суммы чанков.')
+@click.confirmation_option(prompt='Все данные базы будут заменены содержимым копии. Продолжить?')
+def restore_command(path, no_verify):
+    """Восстанавливает базу данных из резервной копии."""
+    try:
+        result = restore_backup(path, verify=not no_verify,
+                                on_table=lambda name, rows: click.echo(f'{name}: {rows} rows'))
+    except BackupError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Restored {result["rows"]} rows into {result["tables"]} tables in {result["seconds"]:.1f}s')
@@ -0,0 +1,177 @@
+# app/charts.py
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Сколько отрисованных графиков держать в памяти процесса
+CHART_CACHE_SIZE = 64
+# Сколько картинок хранить в кэше на диске; лишние удаляются, начиная с давно не читанных
+CHART_DISK_CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_plt = None
+_sns = None
+
+
+def preload():
+    """Импортирует matplotlib и seaborn один раз на процесс.
+
+    Вызывается при старте процесса-воркера, чтобы первый отчет не ждал
+    загрузки графического стека.
+    """
+    global _plt, _sns
+    if _plt is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        _plt, _sns = plt, sns
+    return _plt, _sns
+
+
+def chart_key(chart):
+    """Ключ графика по содержимому: тип и данные."""
+    payload = json.dumps([chart['type'], chart['data']], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _plot(chart):
+    plt, sns = preload()
+
+    # Стиль seaborn меняет глобальные rcParams; rc_context возвращает их обратно,
+    # чтобы картинка зависела только от данных графика
+    with plt.rc_context():
+        fig = plt.figure(figsize=(8, 5), dpi=100)  # Уменьшаем размер и DPI для лучшего качества
+        try:
+            if chart['type'] == 'pie':
+                plt.pie(
+                    chart['data']['values'],
+                    labels=chart['data']['labels'],
+                    autopct='%1.1f%%',
+                    startangle=90,
+                    textprops={'fontsize': 8}  # Уменьшаем размер шрифта
+                )
+                plt.title(chart['data']['title'], fontsize=10)
+                plt.tight_layout()
+
+            elif chart['type'] == 'bar':
+                sns.set(font_scale=0.8)  # Уменьшаем размер шрифта
+                barplot = sns.barplot(
+                    x=chart['data']['labels'],
+                    y=chart['data']['values']
+                )
+                plt.title(chart['data']['title'], fontsize=10)
+                plt.xticks(rotation=45, ha='right', fontsize=8)
+                plt.yticks(fontsize=8)
+
+                # Добавляем значения на столбцы
+                for p in barplot.patches:
+                    barplot.annotate(
+                        format(p.get_height(), '.1f'),
+                        (p.get_x() + p.get_width() / 2., p.get_height()),
+                        ha='center', va='center',
+                        xytext=(0, 5),
+                        textcoords='offset points',
+                        fontsize=8
+                    )
+
+                plt.tight_layout()
+
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', bbox_inches='tight', dpi=150)  # Уменьшаем DPI
+            return buffer.getvalue()
+        finally:
+            plt.close(fig)
+
+
+def render_png(chart, cache_dir=None):
+    """Возвращает PNG графика (bytes), при повторе с теми же данными - из кэша.
+
+    Кэш в памяти процесса ограничен CHART_CACHE_SIZE записями. Если передан
+    cache_dir, картинки также сохраняются на диск под своим хешем и доступны
+    другим процессам; на диске остается не больше CHART_DISK_CACHE_SIZE файлов.
+    """
+    key = chart_key(chart)
+    with _cache_lock:
+        png = _cache.get(key)
+        if png is not None:
+            _cache.move_to_end(key)
+            return png
+
+    path = os.path.join(cache_dir, f'{key}.png') if cache_dir else None
+    png = _read_cached(path) if path else None
+    if png is None:
+        png = _plot(chart)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            partial_path = f'{path}.{os.getpid()}.part'
+            with open(partial_path, 'wb') as f:
+                f.write(png)
+            os.replace(partial_path, path)
+            prune_disk_cache(cache_dir)
+
+    with _cache_lock:
+        _cache[key] = png
+        while len(_cache) > CHART_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return png
+
+
+def _read_cached(path):
+    try:
+        with open(path, 'rb') as f:
+            png = f.read()
+    except FileNotFoundError:
+        return None  # файла нет или его только что удалила очистка в другом процессе
+    # Время изменения - время последнего чтения: очистка удаляет давно не читанные
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return png
+
+
+def prune_disk_cache(cache_dir, max_files=None):
+    """Удаляет из кэша на диске самые старые картинки сверх max_files (по умолчанию CHART_DISK_CACHE_SIZE)."""
+    if max_files is None:
+        max_files = CHART_DISK_CACHE_SIZE
+    files = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.png') and entry.is_file():
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+    if len(files) <= max_files:
+        return 0
+
+    files.sort()
+    removed = 0
+    for _, path in files[:len(files) - max_files]:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def render_charts(pdf, charts, cache_dir=None):
+    """Добавляет графики на текущую страницу документа."""
+    pdf.set_font('DejaVu', 'B', 14)
+    pdf.cell(0, 10, "Визуализация данных", 0, 1, 'C')
+    pdf.ln(10)
+
+    for chart in charts:
+        png = render_png(chart, cache_dir)
+
+        # Добавляем график в PDF
+        pdf.set_font('DejaVu', '', 12)
+        pdf.cell(0, 10, chart['data']['title'], 0, 1, 'C')
+        pdf.image(io.BytesIO(png), x=10, y=None, w=180)
+        pdf.ln(10)
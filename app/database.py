@@ -0,0 +1,202 @@
+# app/database.py
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Ключ SQLALCHEMY_BINDS для реплики только для чтения
+REPLICA_BIND = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def engine_options(config, url):
+    """Параметры движка SQLAlchemy из настроек DB_* для базы url."""
+    options = {
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE']
+    }
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # База в памяти живет в одном соединении, размер пула к ней неприменим
+        return options
+
+    options.update({
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT']
+    })
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT']:
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT']}"}
+    return options
+
+
+def configure_engines(app):
+    """Дополняет конфигурацию параметрами пула и привязкой к реплике. Вызывать до db.init_app."""
+    config = app.config
+    # Явно заданные SQLALCHEMY_ENGINE_OPTIONS важнее значений DB_*
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config, config['SQLALCHEMY_DATABASE_URI']),
+        **(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    }
+
+    replica_url = config['DATABASE_REPLICA_URL']
+    if replica_url:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica_url, **engine_options(config, replica_url)}
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+class RoutingSession(Session):
+    """Сессия, которая внутри read_replica() читает с реплики.
+
+    Запись (flush и DML-запросы) всегда идет в основную базу. Без реплики
+    в SQLALCHEMY_BINDS все запросы идут в основную базу.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _use_replica.get() and not self._flushing and not getattr(clause, 'is_dml', False):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Пользователь, который только что что-то записал, какое-то время читает с основной
+# базы: иначе после сохранения он может увидеть на отстающей реплике старые данные
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_write(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _remember_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(session):
+    if session.info.pop('wrote', False) and has_request_context() and REPLICA_BIND in session._db.engines:
+        flask_session['primary_until'] = time.time() + current_app.config['DB_REPLICA_STICKY']
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
+
+
+@contextmanager
+def read_replica():
+    """Чтение с реплики внутри блока; работает и как декоратор: @read_replica().
+
+    Только для кода, который не читает собственные записи: реплика может
+    отставать от основной базы. В запросе пользователя, который недавно
+    записывал (DB_REPLICA_STICKY), чтение остается на основной базе.
+    """
+    if has_request_context() and flask_session.get('primary_until', 0) > time.time():
+        yield
+        return
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def primary():
+    """Чтение с основной базы даже внутри read_replica().
+
+    Для данных, которые кэшируются в процессе (роли в проектах): ответ
+    отстающей реплики иначе жил бы в кэше дольше самого отставания.
+    """
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class PoolStats:
+    """Счетчики выдачи соединений пулом одного движка (в пределах процесса)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.held_total = 0.0
+        self.held_max = 0.0
+        self._lock = threading.Lock()
+
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.monotonic()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        started = connection_record.info.pop('checked_out_at', None)
+        if started is None:
+            return
+        held = time.monotonic() - started
+        with self._lock:
+            self.checked_out -= 1
+            self.held_total += held
+            self.held_max = max(self.held_max, held)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def as_dict(self):
+        pool = self.engine.pool
+        with self._lock:
+            stats = {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'invalidations': self.invalidations,
+                'checked_out': self.checked_out,
+                'peak_checked_out': self.peak_checked_out,
+                'avg_held_ms': round(self.held_total * 1000 / self.checkouts, 2) if self.checkouts else 0,
+                'max_held_ms': round(self.held_max * 1000, 2)
+            }
+        # Размеры есть только у QueuePool
+        if hasattr(pool, 'checkedout'):
+            stats.update({
+                'pool_size': pool.size(),
+                'idle': pool.checkedin(),
+                'overflow': pool.overflow()
+            })
+        return stats
+
+
+def init_app(app):
+    from app import db
+
+    with app.app_context():
+        app.extensions['pool_stats'] = {
+            bind_key or 'default': PoolStats(engine) for bind_key, engine in db.engines.items()
+        }
+
+
+def pool_stats(app):
+    return {name: stats.as_dict() for name, stats in app.extensions['pool_stats'].items()}
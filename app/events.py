@@ -0,0 +1,208 @@
+# app/events.py
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+from flask import current_app
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Служебный канал: сброс кэшей процесса (app/access.py, app/identity.py, app/fragments.py)
+CACHE_CHANNEL = 'caches'
+
+
+class Subscription:
+    """Очередь событий одного подписчика (одного SSE-соединения)."""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Медленный клиент: события потеряны, ему нужно перезагрузить доску
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class MemoryBroker:
+    """Брокер событий внутри процесса.
+
+    Подходит для одного процесса веб-сервера: подписчики в других процессах
+    события не получат.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._channels = {}
+        self._handlers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def on(self, channel, handler):
+        """Вызывает handler(event) для каждого события канала, пришедшего в этот процесс."""
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            handlers = list(self._handlers.get(channel, ()))
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception:
+                logger.exception('Event handler for %s failed', channel)
+        for subscription in subscribers:
+            subscription.put(event)
+
+
+class PostgresBroker(MemoryBroker):
+    """Брокер поверх PostgreSQL LISTEN/NOTIFY для нескольких процессов.
+
+    События публикуются через NOTIFY. Фоновый поток каждого процесса слушает
+    канал и раздает события локальным подписчикам, в том числе свои же.
+    """
+
+    pg_channel = 'taskflow_events'
+    # Ограничение PostgreSQL на размер payload у NOTIFY - 8000 байт
+    max_payload = 7900
+
+    def __init__(self, app, queue_size=100):
+        super().__init__(queue_size)
+        self.app = app
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        payload = json.dumps({'channel': channel, 'event': event}, ensure_ascii=False)
+        if len(payload.encode('utf-8')) > self.max_payload:
+            # Без готовой разметки клиент перезагрузит карточку сам
+            event = {key: value for key, value in event.items() if key != 'html'}
+            payload = json.dumps({'channel': channel, 'event': event}, ensure_ascii=False)
+
+        with db.engine.connect() as connection:
+            connection.execute(db.text('SELECT pg_notify(:channel, :payload)'),
+                               {'channel': self.pg_channel, 'payload': payload})
+            connection.commit()
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='event-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    connection = db.engine.raw_connection()
+                try:
+                    connection.dbapi_connection.autocommit = True
+                    cursor = connection.cursor()
+                    cursor.execute(f'LISTEN {self.pg_channel}')
+                    raw = connection.dbapi_connection
+                    while True:
+                        if select.select([raw], [], [], 5) == ([], [], []):
+                            continue
+                        raw.poll()
+                        while raw.notifies:
+                            notify = raw.notifies.pop(0)
+                            message = json.loads(notify.payload)
+                            self.deliver(message['channel'], message['event'])
+                finally:
+                    connection.invalidate()
+            except Exception:
+                logger.exception('Event listener failed, reconnecting')
+                time.sleep(3)
+
+
+def init_app(app):
+    backend = app.config['EVENT_BROKER']
+    if backend == 'postgres':
+        broker = PostgresBroker(app, app.config['EVENT_QUEUE_SIZE'])
+    elif backend == 'memory':
+        broker = MemoryBroker(app.config['EVENT_QUEUE_SIZE'])
+    else:
+        raise ValueError(f'Unknown EVENT_BROKER: {backend}')
+    app.extensions['event_broker'] = broker
+    broker.on(CACHE_CHANNEL, _reset_caches)
+    if backend == 'postgres':
+        # Слушатель нужен каждому процессу, даже без открытых SSE-соединений: через него
+        # приходят сбросы кэшей. Поток после fork не наследуется - проверяем на запросе
+        app.before_request(broker._ensure_listener)
+
+
+def _reset_caches(event):
+    from app.access import membership_index
+    from app.fragments import fragment_cache
+    from app.identity import user_cache
+
+    membership_index.invalidate()
+    user_cache.invalidate()
+    fragment_cache.invalidate()
+
+
+def reset_caches():
+    """Сбрасывает кэши данных во всех процессах приложения (после восстановления копии).
+
+    С брокером 'memory' событие доходит только до текущего процесса - в остальных
+    записи кэшей истекают по времени жизни.
+    """
+    _reset_caches(None)
+    try:
+        current_app.extensions['event_broker'].publish(CACHE_CHANNEL, {'type': 'reset'})
+    except Exception:
+        logger.exception('Failed to publish cache reset')
+
+
+def project_channel(project_id):
+    return f'project:{project_id}'
+
+
+def publish_board_event(project_id, event_type, revision, **data):
+    """Публикует изменение доски проекта. Вызывать после коммита."""
+    event = {'type': event_type, 'revision': revision}
+    event.update(data)
+    try:
+        current_app.extensions['event_broker'].publish(project_channel(project_id), event)
+    except Exception:
+        # Событие не критично: клиенты догонят состояние при следующей загрузке
+        logger.exception('Failed to publish %s for project %s', event_type, project_id)
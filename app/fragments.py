@@ -0,0 +1,115 @@
+# app/fragments.py
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from flask import current_app, render_template
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+
+from app.models import db, Task
+
+
+class FragmentCache:
+    """LRU-кэш отрисованных карточек задач: одна запись на задачу.
+
+    Запись действительна для версии (ревизия задачи, дата) - при изменении
+    задачи, переименовании ее исполнителей или смене дня карточка рисуется
+    заново и вытесняет старую. Время жизни записи ограничивает устаревание
+    в процессах, до которых не дошел сброс кэша (app/events.py).
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, task_id, version):
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None or entry[0] != version or entry[2] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(task_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, task_id, version, html, ttl, max_size):
+        with self._lock:
+            self._entries[task_id] = (version, html, time.monotonic() + ttl)
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, task_ids=None):
+        with self._lock:
+            if task_ids is None:
+                self._entries.clear()
+            else:
+                for task_id in task_ids:
+                    self._entries.pop(task_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+fragment_cache = FragmentCache()
+
+
+def _days_remaining(task, today):
+    if task.deadline:
+        return (task.deadline.date() - today).days
+    return float('inf')
+
+
+def task_card(task):
+    """Разметка карточки задачи для доски; из кэша, если задача не менялась с прошлой отрисовки."""
+    today = date.today()
+    # Несохраненные изменения ревизию еще не увеличили - такую карточку не кэшируем
+    cacheable = object_session(task) is None or not inspect(task).modified
+    version = (task.revision, today)
+    if cacheable:
+        html = fragment_cache.get(task.id, version)
+        if html is not None:
+            return html
+
+    task.days_remaining = _days_remaining(task, today)
+    html = Markup(render_template('_task_card.html', task=task))
+    if cacheable:
+        fragment_cache.set(task.id, version, html, current_app.config['FRAGMENT_CACHE_TTL'],
+                           current_app.config['FRAGMENT_CACHE_SIZE'])
+    return html
+
+
+# Сброс кэша при записи задач (после коммита, как в app/identity.py). Изменения,
+# которые не трогают строку task, увеличивают ревизию сами (touch_tasks и
+# переименования пользователей и проектов в app/models.py)
+
+def _remember_task_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    session.info.setdefault('fragment_changes', set()).add(target.id)
+
+
+for _event in ('after_update', 'after_delete'):
+    event.listen(Task, _event, _remember_task_change)
+
+
+@event.listens_for(db.Session, 'after_commit')
+def _apply_changes(session):
+    if 'fragment_changes' in session.info:
+        fragment_cache.invalidate(session.info.pop('fragment_changes'))
+
+
+@event.listens_for(db.Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('fragment_changes', None)
+
+
+def init_app(app):
+    app.jinja_env.globals['task_card'] = task_card
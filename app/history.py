@@ -0,0 +1,126 @@
+# app/history.py
+import json
+from datetime import datetime
+
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy import event, inspect
+
+from app.models import db, Task, TaskExecutor, ChangeHistory
+
+# Поля задачи, изменения которых попадают в историю (плюс состав исполнителей)
+TRACKED_FIELDS = ('title', 'status', 'priority', 'deadline')
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def record_task_changes(task_id, changes, session=None):
+    """Добавляет изменения задачи {поле: (старое, новое)} в буфер сессии.
+
+    Буфер записывается одной многострочной вставкой при коммите. Повторные
+    правки одной задачи в транзакции склеиваются: остается первое старое
+    и последнее новое значение.
+    """
+    session = session or db.session
+    buffer = session.info.setdefault('task_history', {})
+    entry = buffer.setdefault(task_id, {})
+    for field, (old, new) in changes.items():
+        if field in entry:
+            entry[field] = (entry[field][0], new)
+        else:
+            entry[field] = (old, new)
+
+
+def _executor_task_id(link):
+    return link.task.id if link.task is not None else link.task_id
+
+
+@event.listens_for(db.Session, 'before_flush')
+def _collect_changes(session, flush_context, instances):
+    for obj in session.dirty:
+        if not isinstance(obj, Task):
+            continue
+        state = inspect(obj)
+        changes = {}
+        for field in TRACKED_FIELDS:
+            history = state.attrs[field].history
+            if history.has_changes() and history.deleted:
+                changes[field] = (history.deleted[0], history.added[0] if history.added else None)
+        if changes:
+            record_task_changes(obj.id, changes, session)
+
+    # Исполнители: добавленные и удаленные связи по задачам, которые уже есть в базе.
+    # Задачи, созданные или удаленные в этой транзакции, в историю не попадают.
+    skipped = session.info.get('task_history_created', set()) | \
+        {obj.id for obj in session.deleted if isinstance(obj, Task)}
+    added, removed = {}, {}
+    for link in session.new:
+        if isinstance(link, TaskExecutor) and _executor_task_id(link) is not None:
+            added.setdefault(_executor_task_id(link), set()).add(link.user_id)
+    for link in session.deleted:
+        if isinstance(link, TaskExecutor):
+            removed.setdefault(link.task_id, set()).add(link.user_id)
+    for obj in session.dirty:
+        if isinstance(obj, Task):
+            for link in inspect(obj).attrs.executors_link.history.deleted:
+                removed.setdefault(obj.id, set()).add(link.user_id)
+
+    buffer = session.info.get('task_history', {})
+    for task_id in skipped:
+        buffer.pop(task_id, None)
+
+    task_ids = (set(added) | set(removed)) - skipped
+    if not task_ids:
+        return
+
+    # Прежний состав - один запрос на все задачи; строк в базе еще нет, это до записи
+    with session.no_autoflush:
+        before = {}
+        for task_id, user_id in session.query(TaskExecutor.task_id, TaskExecutor.user_id).filter(
+                TaskExecutor.task_id.in_(task_ids)):
+            before.setdefault(task_id, set()).add(user_id)
+
+    for task_id in task_ids:
+        old = before.get(task_id, set())
+        new = (old - removed.get(task_id, set())) | added.get(task_id, set())
+        if old != new:
+            record_task_changes(task_id, {'executors': (sorted(old), sorted(new))}, session)
+
+
+@event.listens_for(db.Session, 'after_flush')
+def _remember_created(session, flush_context):
+    created = [obj.id for obj in session.new if isinstance(obj, Task)]
+    if created:
+        session.info.setdefault('task_history_created', set()).update(created)
+
+
+@event.listens_for(db.Session, 'before_commit')
+def _write_changes(session):
+    # Сначала отправляем в базу отложенные изменения: их разница попадет в буфер
+    session.flush()
+    session.info.pop('task_history_created', None)
+    buffer = session.info.pop('task_history', None)
+    if not buffer:
+        return
+
+    user_id = current_user.id if has_request_context() and current_user.is_authenticated else None
+    rows = []
+    for task_id, fields in buffer.items():
+        changes = {field: {'old': _value(old), 'new': _value(new)}
+                   for field, (old, new) in fields.items() if old != new}
+        if changes:
+            rows.append({
+                'task_id': task_id,
+                'user_id': user_id,
+                'changes': json.dumps(changes, ensure_ascii=False)
+            })
+    if rows:
+        session.execute(db.insert(ChangeHistory), rows)
+
+
+@event.listens_for(db.Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('task_history', None)
+    session.info.pop('task_history_created', None)
@@ -0,0 +1,121 @@
+# app/identity.py
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from app import login_manager
+from app.models import db, User, projects_of_user
+
+
+class CachedUser(UserMixin):
+    """Легкий снимок пользователя для current_user, не привязанный к сессии.
+
+    Хранит только поля, которые читают маршруты и шаблоны. Проекты
+    загружаются отдельным запросом при обращении.
+    """
+
+    def __init__(self, id, name, email):
+        self.id = id
+        self.name = name
+        self.email = email
+
+    @property
+    def is_admin(self):
+        return self.name == 'admin'
+
+    @property
+    def projects(self):
+        return projects_of_user(self.id).all()
+
+    def __repr__(self):
+        return f'<User {self.name}>'
+
+
+class UserCache:
+    """LRU-кэш пользователей по id с ограничением времени жизни записи."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def set(self, user, ttl, max_size):
+        with self._lock:
+            self._entries[user.id] = (user, time.monotonic() + ttl)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids=None):
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
+
+
+user_cache = UserCache()
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    user = user_cache.get(user_id)
+    if user is None:
+        row = db.session.query(User.id, User.name, User.email).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.name, row.email)
+        user_cache.set(user, current_app.config['USER_CACHE_TTL'], current_app.config['USER_CACHE_SIZE'])
+    return user
+
+
+# Сброс кэша при изменении пользователей (после коммита, как в app/access.py)
+
+def _remember_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    changes = session.info.setdefault('user_changes', set())
+    if changes is not None:  # None - кэш будет сброшен целиком
+        changes.add(target.id)
+
+
+for _event in ('after_update', 'after_delete'):
+    event.listen(User, _event, _remember_change)
+
+
+@event.listens_for(db.Session, 'do_orm_execute')
+def _remember_bulk_change(orm_execute_state):
+    # Массовые UPDATE/DELETE по user не вызывают событий маппера
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is User:
+        orm_execute_state.session.info['user_changes'] = None
+
+
+@event.listens_for(db.Session, 'after_commit')
+def _apply_changes(session):
+    if 'user_changes' in session.info:
+        user_cache.invalidate(session.info.pop('user_changes'))
+
+
+@event.listens_for(db.Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('user_changes', None)
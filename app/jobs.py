@@ -0,0 +1,358 @@
+# app/jobs.py
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import BrokenExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.models import Report
+
+logger = logging.getLogger(__name__)
+
+reports_cli = AppGroup('reports', help='Фоновая генерация отчетов.')
+
+# Ошибки построения отчета, которые повторяются при каждой попытке
+PERMANENT_ERRORS = (ValueError, LookupError)
+
+# Приложение процесса-воркера: создается один раз при старте процесса пула
+_worker_app = None
+
+
+def _init_worker():
+    global _worker_app
+    from app import create_app
+    from app.charts import preload
+    _worker_app = create_app()
+    # Графический стек грузим сразу, а не при первом PDF-отчете
+    preload()
+
+
+def _run_job(report_id):
+    """Выполняется в процессе пула: строит отчет и возвращает путь к файлу."""
+    from app.reports import build_report
+
+    with _worker_app.app_context():
+        try:
+            return build_report(report_id)
+        finally:
+            db.session.remove()
+
+
+class ReportQueue:
+    """Очередь отчетов поверх таблицы report.
+
+    Записи со статусом 'pending' ждут выполнения. Диспетчер атомарно
+    переводит их в 'running' и отдает пулу процессов. Успешный отчет
+    становится 'completed'; при ошибке запись возвращается в 'pending',
+    пока не исчерпаны попытки, после чего помечается 'failed'.
+
+    Захваченные записи помечены worker_id диспетчера, который на каждом цикле
+    обновляет их heartbeat_at. Записи, чей диспетчер молчит дольше
+    REPORT_HEARTBEAT_TIMEOUT, возвращаются в очередь любым диспетчером;
+    отчет дольше REPORT_JOB_TIMEOUT снимается своим диспетчером вместе с пулом.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.concurrency = max(1, app.config['REPORT_WORKERS'])
+        self.max_retries = app.config['REPORT_MAX_RETRIES']
+        self.poll_interval = app.config['REPORT_POLL_INTERVAL']
+        self.job_timeout = app.config['REPORT_JOB_TIMEOUT']
+        self.heartbeat_timeout = app.config['REPORT_HEARTBEAT_TIMEOUT']
+        self.start_method = app.config['REPORT_WORKER_START_METHOD']
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._in_flight = {}  # id отчета -> время запуска (monotonic)
+        self._executor = None
+        self._thread = None
+        self.worker_id = None
+
+    def start(self):
+        """Запускает диспетчер в фоновом потоке (повторный вызов ничего не делает)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+            self._thread = threading.Thread(target=self.run, name='report-dispatcher', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify(self):
+        """Будит диспетчер, не дожидаясь следующего опроса таблицы."""
+        self._wakeup.set()
+
+    def run(self):
+        """Цикл диспетчера: забирает отчеты из таблицы и раздает их воркерам."""
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self._heartbeat()
+                    self._expire_timed_out()
+                    self._requeue_stale()
+                    self._dispatch()
+                    db.session.remove()
+            except Exception:
+                logger.exception('Ошибка диспетчера отчетов')
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _get_executor(self):
+        # Пул процессов нужен только при первом отчете - не грузим multiprocessing при старте
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.concurrency,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def _dispatch(self):
+        with self._lock:
+            free_slots = self.concurrency - len(self._in_flight)
+        if free_slots <= 0:
+            return
+
+        candidates = db.session.query(Report.id).filter(
+            Report.status == 'pending'
+        ).order_by(Report.timestamp, Report.id).limit(free_slots).all()
+
+        for (report_id,) in candidates:
+            if not self._claim(report_id):
+                continue  # отчет уже забрал другой диспетчер
+
+            with self._lock:
+                self._in_flight[report_id] = time.monotonic()
+            try:
+                future = self._get_executor().submit(_run_job, report_id)
+            except (BrokenExecutor, RuntimeError) as e:
+                self._reset_executor()
+                self._finish(report_id, error=e)
+                continue
+            future.add_done_callback(lambda f, report_id=report_id: self._on_done(report_id, f))
+
+    def _claim(self, report_id):
+        now = datetime.now()
+        claimed = Report.query.filter_by(id=report_id, status='pending').update({
+            'status': 'running',
+            'started_at': now,
+            'heartbeat_at': now,
+            'worker_id': self.worker_id,
+            'attempts': Report.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _on_done(self, report_id, future):
+        with self._lock:
+            if report_id not in self._in_flight:
+                return  # отчет уже снят по таймауту
+        error = future.exception()
+        if isinstance(error, BrokenExecutor):
+            self._reset_executor()
+
+        with self.app.app_context():
+            try:
+                self._finish(report_id, file_path=None if error else future.result(), error=error)
+            except Exception:
+                logger.exception('Не удалось сохранить результат отчета %s', report_id)
+            finally:
+                db.session.remove()
+
+        self.notify()
+
+    def _finish(self, report_id, file_path=None, error=None):
+        with self._lock:
+            self._in_flight.pop(report_id, None)
+
+        report = db.session.get(Report, report_id)
+        # Запись, которую уже вернули в очередь и забрал другой диспетчер, не трогаем
+        if report is None or report.status != 'running' or report.worker_id != self.worker_id:
+            db.session.rollback()
+            return
+
+        if error is None:
+            report.status = 'completed'
+            report.file_path = file_path
+            report.error_message = None
+            report.completed_at = datetime.now()
+        else:
+            report.error_message = str(error)
+            report.worker_id = None
+            # Неизвестный тип, формат или отсутствующая запись не исправятся повтором
+            if report.attempts <= self.max_retries and not isinstance(error, PERMANENT_ERRORS):
+                report.status = 'pending'
+            else:
+                report.status = 'failed'
+                report.completed_at = datetime.now()
+            logger.error('Failed to generate report %s (attempt %s): %s', report_id, report.attempts, error)
+
+        db.session.commit()
+
+    def _reset_executor(self, terminate=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        # Зависший процесс shutdown не остановит: завершаем процессы пула явно
+        processes = list((getattr(executor, '_processes', None) or {}).values()) if terminate else []
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def _heartbeat(self):
+        """Отмечает, что отчеты этого диспетчера еще выполняются."""
+        with self._lock:
+            report_ids = list(self._in_flight)
+        if report_ids:
+            Report.query.filter(
+                Report.id.in_(report_ids),
+                Report.status == 'running',
+                Report.worker_id == self.worker_id
+            ).update({'heartbeat_at': datetime.now()}, synchronize_session=False)
+            db.session.commit()
+
+    def _expire_timed_out(self):
+        """Снимает отчеты, которые выполняются дольше REPORT_JOB_TIMEOUT."""
+        deadline = time.monotonic() - self.job_timeout
+        with self._lock:
+            expired = [report_id for report_id, started in self._in_flight.items() if started < deadline]
+        if not expired:
+            return
+        # Остановить один процесс пула нельзя - пересоздаем пул; прочие отчеты из него
+        # завершатся с BrokenProcessPool и вернутся в очередь как обычная ошибка
+        self._reset_executor(terminate=True)
+        for report_id in expired:
+            self._finish(report_id, error=TimeoutError(f'Отчет выполнялся дольше {self.job_timeout} с'))
+
+    def _requeue_stale(self):
+        """Возвращает в очередь отчеты, чей диспетчер перестал подавать сигнал (упал процесс)."""
+        now = datetime.now()
+        stale = db.and_(Report.status == 'running', db.or_(
+            Report.heartbeat_at < now - timedelta(seconds=self.heartbeat_timeout),
+            # Записи, захваченные до появления heartbeat_at
+            db.and_(Report.heartbeat_at.is_(None), Report.started_at < now - timedelta(seconds=self.job_timeout))
+        ))
+        failed = Report.query.filter(stale, Report.attempts > self.max_retries).update({
+            'status': 'failed', 'worker_id': None, 'completed_at': now,
+            'error_message': 'Воркер отчета перестал отвечать'
+        }, synchronize_session=False)
+        requeued = Report.query.filter(stale).update(
+            {'status': 'pending', 'worker_id': None}, synchronize_session=False
+        )
+        db.session.commit()
+        if requeued or failed:
+            logger.warning('Requeued %s stale reports, failed %s', requeued, failed)
+
+
+def init_app(app):
+    queue = app.extensions['report_queue'] = ReportQueue(app)
+    app.cli.add_command(reports_cli)
+
+    if app.config['REPORT_WORKERS_EMBEDDED']:
+        # Диспетчер стартует с первым запросом, а не при импорте приложения:
+        # CLI-команды и мастер-процесс gunicorn пул не поднимают
+        @app.before_request
+        def _start_report_queue():
+            queue.start()
+
+
+def wake_report_workers():
+    """Сообщает очереди о новом отчете."""
+    current_app.extensions['report_queue'].notify()
+
+
+@reports_cli.command('worker')
+@click.option('--concurrency', type=int, default=None, help='Число процессов-воркеров.')
+def worker_command(concurrency):
+    """Запускает обработку очереди отчетов в текущем процессе."""
+    queue = current_app.extensions['report_queue']
+    if concurrency:
+        queue.concurrency = concurrency
+
+    click.echo(f'Report worker started with {queue.concurrency} processes')
+    queue.start()
+    try:
+        while queue.is_running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.stop()
+
+
+@reports_cli.command('bench-pdf')
+@click.option('--rows', type=int, multiple=True, help='Размер отчета (можно указать несколько раз).')
+@click.option('--workers', type=int, default=None, help='Число процессов для параллельной отрисовки.')
+@click.option('--chunk-rows', type=int, default=None, help='Строк в одной части документа.')
+def bench_pdf_command(rows, workers, chunk_rows):
+    """Сравнивает однопроцессную и параллельную отрисовку PDF на синтетических данных."""
+    import tempfile
+    from app.reports import REPORT_TYPES, generate_pdf_report
+
+    sizes = rows or (10000, 100000, 500000)
+    workers = workers or current_app.config['PDF_RENDER_WORKERS'] or os.cpu_count() or 1
+    chunk_rows = chunk_rows or current_app.config['PDF_CHUNK_ROWS']
+    spec = REPORT_TYPES['tasks']
+    statuses = ['To Do', 'In Progress', 'Done']
+
+    click.echo(f'{"rows":>8} {"single, s":>10} {"parallel, s":>12} {"speedup":>8}  ({workers} workers)')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in sizes:
+            data = [{
+                'id': i,
+                'title': f'Задача {i} ' + 'описание ' * (i % 4),
+                'status': statuses[i % 3],
+                'project': f'Проект {i % 50}',
+                'created_at': '01.01.2025 10:00',
+                'deadline': '31.12.2025' if i % 5 else None,
+                'manager': f'Менеджер {i % 20}',
+                'executors': ', '.join(f'Исполнитель {j}' for j in range(i % 3 + 1))
+            } for i in range(1, size + 1)]
+
+            timings = []
+            for parallel in (False, True):
+                started = time.perf_counter()
+                generate_pdf_report(
+                    title=spec['title'],
+                    data=data,
+                    filename=os.path.join(tmpdir, f'{size}_{int(parallel)}.pdf'),
+                    columns=spec['columns'],
+                    workers=workers if parallel else 1,
+                    parallel_min_rows=0,
+                    chunk_rows=chunk_rows
+                )
+                timings.append(time.perf_counter() - started)
+
+            click.echo(f'{size:>8} {timings[0]:>10.1f} {timings[1]:>12.1f} {timings[0] / timings[1]:>7.2f}x')
@@ -1,10 +1,19 @@
 # models.py
 from datetime import datetime
 
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import joinedload, selectinload, object_session
 from werkzeug.security import generate_password_hash, check_password_hash
-from . import db, login_manager
+from . import db
 from flask_login import UserMixin
 
+# Статусы задач: ключ для API и шаблонов -> значение в БД
+TASK_STATUSES = {
+    'todo': 'To Do',
+    'in_progress': 'In Progress',
+    'done': 'Done'
+}
+
 
 class User(db.Model, UserMixin):
     __tablename__ = "user"
@@ -42,6 +51,14 @@ class User(db.Model, UserMixin):
 
 class Task(db.Model):
     __tablename__ = "task"
+    __table_args__ = (
+        # Доска и статистика проекта: WHERE project_id [AND status], GROUP BY project_id, status
+        db.Index('ix_task_project_status', 'project_id', 'status'),
+        # Список задач менеджера в порядке keyset-пагинации (deadline, id)
+        db.Index('ix_task_manager_deadline', 'manager_id', 'deadline', 'id'),
+        # Фильтры и сортировка по дедлайну
+        db.Index('ix_task_deadline', 'deadline', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(255), nullable=False)
@@ -49,7 +66,12 @@ class Task(db.Model):
     deadline = db.Column(db.DateTime)
     priority = db.Column(db.String(50))
     status = db.Column(db.String(50), default='To Do')
+    position = db.Column(db.Integer)  # порядок карточки в колонке доски
     created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    # Версия задачи для ETag/Last-Modified: меняется при любой записи в задачу,
+    # ее исполнителей или комментарии. updated_at хранится в UTC
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Foreign keys
     executor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
@@ -61,7 +83,7 @@ class Task(db.Model):
     manager = db.relationship('User', foreign_keys=[manager_id], back_populates='managed_tasks', lazy=True)
     project = db.relationship('Project', back_populates='tasks', lazy=True)
     task_card = db.relationship('TaskCard', back_populates='task', uselist=False, lazy=True)
-    change_history = db.relationship('ChangeHistory', back_populates='task', lazy=True)
+    change_history = db.relationship('ChangeHistory', back_populates='task', lazy=True, cascade="all, delete-orphan")
     executors_link = db.relationship('TaskExecutor', back_populates='task', cascade='all, delete-orphan')
     executors = db.relationship('User', secondary='task_executor', back_populates='assigned_tasks')
     comments = db.relationship('Comment', back_populates='task', lazy=True, cascade="all, delete-orphan")
@@ -77,6 +99,8 @@ class Project(db.Model):
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
     deadline = db.Column(db.DateTime)
+    # Увеличивается при каждом изменении задач на доске проекта
+    board_revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @property
     def formatted_created_at(self):
@@ -107,6 +131,10 @@ class Project(db.Model):
 
 class ProjectUser(db.Model):
     __tablename__ = 'project_user'
+    __table_args__ = (
+        # Проекты пользователя; первичный ключ начинается с project_id
+        db.Index('ix_project_user_user', 'user_id', 'project_id'),
+    )
 
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
@@ -159,6 +187,10 @@ class TaskCard(db.Model):
 
 class Comment(db.Model):
     __tablename__ = "comment"
+    __table_args__ = (
+        # Комментарии задачи в порядке добавления
+        db.Index('ix_comment_task_id', 'task_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     content = db.Column(db.Text, nullable=False)
@@ -196,6 +228,11 @@ class AttachedFile(db.Model):
 
 class Notification(db.Model):
     __tablename__ = "notification"
+    __table_args__ = (
+        db.Index('ix_notification_recipient_read', 'recipient_id', 'is_read'),
+        # Лента уведомлений пользователя, новые сверху
+        db.Index('ix_notification_recipient_id', 'recipient_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     type = db.Column(db.String(50))
@@ -213,16 +250,60 @@ class Notification(db.Model):
         return f'<Notification {self.type}>'
 
 
+class NotificationEvent(db.Model):
+    """Событие, из которого рассылаются уведомления (очередь app/notifications.py)."""
+    __tablename__ = "notification_event"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    type = db.Column(db.String(50), nullable=False)
+    # Без внешних ключей: задачу могут удалить до рассылки, такое событие пропускается
+    task_id = db.Column(db.Integer, nullable=False)
+    actor_id = db.Column(db.Integer)
+    payload = db.Column(db.JSON)
+    # Часы базы, как у notification.timestamp: время события становится временем уведомления
+    created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+
+    def __repr__(self):
+        return f'<NotificationEvent {self.type} {self.task_id}>'
+
+
+class NotificationCounter(db.Model):
+    """Число непрочитанных уведомлений пользователя.
+
+    Отдельная таблица, а не колонка user: счетчик часто меняется, а запись
+    пользователя кэшируется (app/identity.py).
+    """
+    __tablename__ = "notification_counter"
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<NotificationCounter {self.user_id}: {self.unread}>'
+
+
 class Report(db.Model):
     __tablename__ = "report"
+    __table_args__ = (
+        # Последние отчеты на панели администратора
+        db.Index('ix_report_timestamp', 'timestamp'),
+        # Выбор очередного отчета диспетчером (app/jobs.py)
+        db.Index('ix_report_status_timestamp', 'status', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     report_type = db.Column(db.String(50), nullable=False)  # 'backup', 'tasks', 'projects', 'users'
     format = db.Column(db.String(10), default='json')  # Добавляем поле для формата
     parameters = db.Column(db.JSON)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
-    status = db.Column(db.String(20), default='pending')
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'running', 'completed', 'failed'
+    progress = db.Column(db.Integer)  # Процент выполнения длительных задач (резервные копии)
+    # Диспетчер, который выполняет отчет, и время его последнего сигнала (app/jobs.py)
+    worker_id = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
     file_path = db.Column(db.String(255))
     error_message = db.Column(db.Text)
     generator_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -235,8 +316,13 @@ class Report(db.Model):
 
 class ChangeHistory(db.Model):
     __tablename__ = "change_history"
+    __table_args__ = (
+        # История задачи, новые записи сверху
+        db.Index('ix_change_history_task_id', 'task_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # JSON {поле: {"old": ..., "new": ...}}, пишется app/history.py
     changes = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=db.func.now())
 
@@ -253,6 +339,10 @@ class ChangeHistory(db.Model):
 
 class TaskExecutor(db.Model):
     __tablename__ = 'task_executor'
+    __table_args__ = (
+        # Задачи исполнителя; первичный ключ начинается с task_id
+        db.Index('ix_task_executor_user', 'user_id', 'task_id'),
+    )
 
     task_id = db.Column(db.Integer, db.ForeignKey('task.id'), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
@@ -260,6 +350,175 @@ class TaskExecutor(db.Model):
     task = db.relationship('Task', back_populates='executors_link')
     user = db.relationship('User', back_populates='assigned_tasks_link')
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+
+# Построители запросов с жадной загрузкой связей.
+# Маршруты и генератор отчетов берут данные только через них, чтобы страница
+# стоила фиксированное число запросов независимо от количества строк.
+
+def tasks_with_project():
+    """Задачи вместе с проектом (для списков задач)."""
+    return Task.query.options(joinedload(Task.project))
+
+
+def tasks_with_people():
+    """Задачи с проектом, менеджером и исполнителями."""
+    return Task.query.options(
+        joinedload(Task.project),
+        joinedload(Task.manager),
+        selectinload(Task.executors),
+        selectinload(Task.executors_link)
+    )
+
+
+def projects_of_user(user_id):
+    """Проекты, в которых участвует пользователь."""
+    return Project.query.join(ProjectUser).filter(ProjectUser.user_id == user_id)
+
+
+def projects_with_members():
+    """Проекты с участниками и их ролями."""
+    return Project.query.options(
+        selectinload(Project.user_associations).joinedload(ProjectUser.user)
+    )
+
+
+def project_with_members(project_id):
+    """Один проект с участниками и их ролями."""
+    return Project.query.options(
+        selectinload(Project.user_associations).joinedload(ProjectUser.user)
+    ).filter(Project.id == project_id)
+
+
+def comments_with_authors(task_id, newest_first=False):
+    """Комментарии задачи вместе с авторами, в порядке добавления (или обратном)."""
+    query = Comment.query.options(joinedload(Comment.author)).filter(Comment.task_id == task_id)
+    if newest_first:
+        return query.order_by(Comment.id.desc())
+    return query.order_by(Comment.id)
+
+
+def history_with_users(task_id):
+    """История изменений задачи вместе с авторами, новые записи сверху."""
+    return ChangeHistory.query.options(joinedload(ChangeHistory.user)).filter(
+        ChangeHistory.task_id == task_id
+    ).order_by(ChangeHistory.id.desc())
+
+
+def reports_with_generator():
+    """Отчеты вместе с автором."""
+    return Report.query.options(joinedload(Report.generator))
+
+
+def users_with_activity():
+    """Пользователи с проектами и назначенными задачами (для отчетов)."""
+    return User.query.options(
+        selectinload(User.projects),
+        selectinload(User.assigned_tasks)
+    )
+
+
+def tasks_of_user(user_id, role='all'):
+    """Задачи, где пользователь исполнитель ('executor'), менеджер ('manager') или любое из двух."""
+    is_executor = db.exists().where(
+        TaskExecutor.task_id == Task.id,
+        TaskExecutor.user_id == user_id
+    )
+    is_manager = Task.manager_id == user_id
+
+    query = tasks_with_project()
+    if role == 'executor':
+        return query.filter(is_executor)
+    if role == 'manager':
+        return query.filter(is_manager)
+    return query.filter(db.or_(is_executor, is_manager))
+
+
+def task_status_counts(project_ids):
+    """Число задач по (project_id, status) для переданных проектов."""
+    return db.session.query(Task.project_id, Task.status, db.func.count(Task.id)).filter(
+        Task.project_id.in_(project_ids)
+    ).group_by(Task.project_id, Task.status)
+
+
+def project_task_stats(project_ids):
+    """Считает задачи проектов по статусам одним запросом GROUP BY.
+
+    Возвращает словарь {project_id: {'total_tasks': ..., 'tasks_by_status': {...}}},
+    в котором есть все переданные проекты, включая проекты без задач.
+    """
+    project_ids = list(project_ids)
+    stats = {
+        project_id: {
+            'total_tasks': 0,
+            'tasks_by_status': {key: 0 for key in TASK_STATUSES}
+        }
+        for project_id in project_ids
+    }
+    if not project_ids:
+        return stats
+
+    status_keys = {value: key for key, value in TASK_STATUSES.items()}
+    for project_id, status, count in task_status_counts(project_ids):
+        stats[project_id]['total_tasks'] += count
+        if status in status_keys:
+            stats[project_id]['tasks_by_status'][status_keys[status]] += count
+
+    return stats
+
+
+def bump_board_revision(project_id):
+    """Увеличивает ревизию доски проекта в текущей транзакции и возвращает новое значение."""
+    return db.session.execute(
+        db.update(Project).where(Project.id == project_id).values(
+            board_revision=Project.board_revision + 1
+        ).returning(Project.board_revision)
+    ).scalar()
+
+
+def touch_tasks(task_ids):
+    """Увеличивает версию задач, изменения которых не затрагивают строку task (комментарии, пакетные правки)."""
+    task_ids = list(task_ids)
+    if task_ids:
+        db.session.execute(
+            db.update(Task).where(Task.id.in_(task_ids)).values(
+                revision=Task.revision + 1,
+                updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+
+
+@event.listens_for(Task, 'before_update')
+def _bump_task_revision(mapper, connection, target):
+    # Срабатывает и при изменении одних только исполнителей; увеличение делается в SQL,
+    # чтобы параллельные записи не потеряли версию
+    if object_session(target).is_modified(target):
+        target.revision = Task.revision + 1
+        target.updated_at = datetime.utcnow()
+
+
+def _touch_tasks_where(connection, condition):
+    connection.execute(db.update(Task).where(condition).values(
+        revision=Task.revision + 1,
+        updated_at=datetime.utcnow()
+    ))
+
+
+# Имена и email пользователей и название проекта входят в ответы API задач и карточки
+# доски, но строку task не меняют: при переименовании увеличиваем версию связанных задач
+
+@event.listens_for(User, 'after_update')
+def _touch_user_tasks(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if not (attrs.name.history.has_changes() or attrs.email.history.has_changes()):
+        return
+    _touch_tasks_where(connection, Task.id.in_(db.union(
+        db.select(Task.id).where(db.or_(Task.manager_id == target.id, Task.executor_id == target.id)),
+        db.select(TaskExecutor.task_id).where(TaskExecutor.user_id == target.id),
+        db.select(Comment.task_id).where(Comment.author_id == target.id)
+    )))
+
+
+@event.listens_for(Project, 'after_update')
+def _touch_project_tasks(mapper, connection, target):
+    if inspect(target).attrs.name.history.has_changes():
+        _touch_tasks_where(connection, Task.project_id == target.id)
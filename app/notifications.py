@@ -0,0 +1,273 @@
+# app/notifications.py
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import event
+
+from app.models import db, User, Task, Notification, NotificationEvent, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+notifications_cli = AppGroup('notifications', help='Рассылка уведомлений.')
+
+
+def enqueue(event_type, task_id, actor_id=None, **payload):
+    """Ставит событие в очередь рассылки. Уходит вместе с коммитом вызывающего."""
+    db.session.add(NotificationEvent(type=event_type, task_id=task_id, actor_id=actor_id, payload=payload or None))
+    db.session.info['notification_events'] = True
+
+
+def enqueue_many(events):
+    """То же для пачки событий: словари с type, task_id, actor_id, payload."""
+    if events:
+        db.session.execute(db.insert(NotificationEvent), events)
+        db.session.info['notification_events'] = True
+
+
+@event.listens_for(db.Session, 'after_commit')
+def _wake_after_commit(session):
+    if session.info.pop('notification_events', False) and has_app_context():
+        wake_notification_worker()
+
+
+@event.listens_for(db.Session, 'after_rollback')
+def _discard_events(session):
+    session.info.pop('notification_events', None)
+
+
+# Кому и что пишем по каждому типу события
+
+def _task_people(task):
+    return {task.manager_id} | {link.user_id for link in task.executors_link}
+
+
+def _recipients(item, task):
+    if item.type == 'task_assigned':
+        recipients = set((item.payload or {}).get('user_ids', []))
+    else:
+        recipients = _task_people(task)
+    recipients.discard(None)
+    recipients.discard(item.actor_id)
+    return recipients
+
+
+def _message(item, task, actor_name):
+    payload = item.payload or {}
+    if item.type == 'task_assigned':
+        return f'{actor_name} назначил(а) вас исполнителем задачи «{task.title}»'
+    if item.type == 'task_status':
+        return f'{actor_name} перевел(а) задачу «{task.title}» в статус {payload.get("status", task.status)}'
+    if item.type == 'task_comment':
+        return f'{actor_name} прокомментировал(а) задачу «{task.title}»'
+    return f'Изменения в задаче «{task.title}»'
+
+
+def deliver_batch(batch_size):
+    """Рассылает одну пачку событий; возвращает число обработанных событий.
+
+    События забираются удалением с RETURNING: другой процесс их уже не
+    увидит, а при ошибке откат вернет их в очередь. Уведомления вставляются
+    одним executemany, счетчики непрочитанных увеличиваются в той же транзакции.
+    """
+    claimed = db.select(NotificationEvent.id).order_by(NotificationEvent.id).limit(batch_size) \
+        .with_for_update(skip_locked=True).scalar_subquery()
+    events = db.session.execute(
+        db.delete(NotificationEvent).where(NotificationEvent.id.in_(claimed)).returning(
+            NotificationEvent.id, NotificationEvent.type, NotificationEvent.task_id,
+            NotificationEvent.actor_id, NotificationEvent.payload, NotificationEvent.created_at
+        ),
+        execution_options={'synchronize_session': False}
+    ).all()
+    if not events:
+        db.session.rollback()
+        return 0
+    events.sort(key=lambda item: item.id)
+
+    tasks = {task.id: task for task in Task.query.options(db.selectinload(Task.executors_link)).filter(
+        Task.id.in_({item.task_id for item in events})
+    )}
+    actor_ids = {item.actor_id for item in events if item.actor_id is not None}
+    actors = dict(db.session.query(User.id, User.name).filter(User.id.in_(actor_ids)).all()) if actor_ids else {}
+
+    rows = []
+    for item in events:
+        task = tasks.get(item.task_id)
+        if task is None:
+            continue
+        message = _message(item, task, actors.get(item.actor_id, 'Кто-то'))
+        for recipient_id in sorted(_recipients(item, task)):
+            rows.append({
+                'type': item.type,
+                'message': message,
+                'timestamp': item.created_at,
+                'is_read': False,
+                'recipient_id': recipient_id
+            })
+
+    if rows:
+        db.session.execute(db.insert(Notification), rows)
+        _increment_unread(Counter(row['recipient_id'] for row in rows))
+    db.session.commit()
+    return len(events)
+
+
+def _increment_unread(counts):
+    # Порядок по user_id: параллельные рассылки блокируют строки в одном порядке
+    values = [{'user_id': user_id, 'unread': count} for user_id, count in sorted(counts.items())]
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(NotificationCounter)
+        statement = statement.on_conflict_do_update(
+            index_elements=[NotificationCounter.user_id],
+            set_={'unread': NotificationCounter.unread + statement.excluded.unread}
+        )
+        db.session.execute(statement, values)
+        return
+
+    for value in values:
+        updated = db.session.query(NotificationCounter).filter_by(user_id=value['user_id']).update(
+            {'unread': NotificationCounter.unread + value['unread']}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(NotificationCounter(**value))
+    db.session.flush()
+
+
+def unread_count(user_id):
+    """Число непрочитанных уведомлений - чтение одной строки по первичному ключу."""
+    return db.session.query(NotificationCounter.unread).filter_by(user_id=user_id).scalar() or 0
+
+
+def mark_read(user_id, notification_ids=None):
+    """Отмечает прочитанными указанные (или все) уведомления пользователя; возвращает их число."""
+    query = Notification.query.filter(Notification.recipient_id == user_id, Notification.is_read == db.false())
+    if notification_ids is not None:
+        query = query.filter(Notification.id.in_(notification_ids))
+    updated = query.update({'is_read': True}, synchronize_session=False)
+
+    # Вычитаем ровно отмеченные: уведомления, добавленные deliver_batch параллельно, остаются в счетчике
+    if updated:
+        NotificationCounter.query.filter_by(user_id=user_id).update(
+            {'unread': NotificationCounter.unread - updated}, synchronize_session=False
+        )
+    db.session.commit()
+    return updated
+
+
+class NotificationDispatcher:
+    """Фоновый поток, который разбирает очередь notification_event пачками."""
+
+    def __init__(self, app):
+        self.app = app
+        self.batch_size = app.config['NOTIFICATION_BATCH_SIZE']
+        self.poll_interval = app.config['NOTIFICATION_POLL_INTERVAL']
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            # Сбрасываем флаг до разбора: событие, пришедшее во время рассылки, не потеряется
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    try:
+                        while deliver_batch(self.batch_size) and not self._stopped.is_set():
+                            pass
+                    finally:
+                        db.session.remove()
+            except Exception:
+                logger.exception('Ошибка рассылки уведомлений')
+            self._wakeup.wait(self.poll_interval)
+
+
+def init_app(app):
+    app.extensions['notification_dispatcher'] = NotificationDispatcher(app)
+    app.cli.add_command(notifications_cli)
+
+
+def wake_notification_worker():
+    dispatcher = current_app.extensions['notification_dispatcher']
+    if current_app.config['NOTIFICATION_WORKER_EMBEDDED']:
+        dispatcher.start()
+    dispatcher.notify()
+
+
+@notifications_cli.command('worker')
+def worker_command():
+    """Запускает рассылку уведомлений в текущем процессе."""
+    dispatcher = current_app.extensions['notification_dispatcher']
+    click.echo('Notification worker started')
+    dispatcher.start()
+    try:
+        while dispatcher.is_running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dispatcher.stop()
+
+
+@notifications_cli.command('deliver')
+def deliver_command():
+    """Разбирает очередь до конца и завершается."""
+    batch_size = current_app.config['NOTIFICATION_BATCH_SIZE']
+    total = 0
+    while True:
+        delivered = deliver_batch(batch_size)
+        if not delivered:
+            break
+        total += delivered
+    click.echo(f'Processed {total} events')
+
+
+@notifications_cli.command('recount')
+def recount_command():
+    """Пересчитывает счетчики непрочитанных по таблице notification."""
+    counts = db.session.query(Notification.recipient_id, db.func.count()).filter(
+        Notification.recipient_id.isnot(None),
+        Notification.is_read == db.false()
+    ).group_by(Notification.recipient_id).all()
+
+    db.session.query(NotificationCounter).delete(synchronize_session=False)
+    if counts:
+        db.session.execute(db.insert(NotificationCounter),
+                           [{'user_id': user_id, 'unread': count} for user_id, count in counts])
+    db.session.commit()
+    click.echo(f'Recounted unread notifications for {len(counts)} users')
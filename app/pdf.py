@@ -0,0 +1,362 @@
+# app/pdf.py
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+# Шрифты для PDF: отдельные начертания из app/fonts, если они установлены,
+# иначе обычный DejaVuSans, который лежит в пакете
+FONTS_DIR = os.path.join(os.path.dirname(__file__), 'fonts')
+FALLBACK_FONT = os.path.join(os.path.dirname(__file__), 'DejaVuSans.ttf')
+FONT_FILES = {
+    '': 'DejaVuSansCondensed.ttf',
+    'B': 'DejaVuSansCondensed-Bold.ttf'
+}
+
+
+def add_fonts(pdf, family='DejaVu'):
+    """Регистрирует семейство шрифтов с кириллицей в документе."""
+    for style, name in FONT_FILES.items():
+        path = os.path.join(FONTS_DIR, name)
+        pdf.add_font(family, style, path if os.path.exists(path) else FALLBACK_FONT)
+
+
+class ReportPDF(FPDF):
+    """Документ отчета с номером страницы в нижнем колонтитуле.
+
+    page_offset сдвигает нумерацию: так части большого отчета, собранные
+    в разных процессах, после склейки нумеруются сквозным образом.
+    """
+
+    def __init__(self, page_offset=0):
+        super().__init__()
+        self.page_offset = page_offset
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('DejaVu', '', 8)
+        self.cell(0, 10, f'Страница {self.page_no() + self.page_offset}', align='C')
+
+
+def new_document(page_offset=0):
+    pdf = ReportPDF(page_offset)
+    pdf.set_auto_page_break(auto=True, margin=25)
+    add_fonts(pdf)
+    pdf.add_page()
+    return pdf
+
+
+def render_title(pdf, title, generated_at):
+    # Заголовок
+    pdf.set_font('DejaVu', 'B', 16)
+    pdf.cell(0, 10, title, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+    pdf.ln(10)
+
+    # Дата генерации
+    pdf.set_font('DejaVu', '', 10)
+    pdf.cell(0, 5, f"Сгенерировано: {generated_at.strftime('%d.%m.%Y %H:%M')}",
+             new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+    pdf.ln(10)
+
+
+class TextMetrics:
+    """Кэш ширин строк и переносов для одного документа.
+
+    Ширина текста зависит только от шрифта, начертания и кегля, поэтому
+    повторяющиеся значения (статусы, имена, названия проектов) измеряются
+    один раз. Переносы кэшируются с учетом ширины колонки и переиспользуются
+    при отрисовке, так что каждая ячейка раскладывается ровно один раз.
+    """
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self._widths = {}
+        self._lines = {}
+
+    def _font_key(self):
+        return self.pdf.font_family, self.pdf.font_style, self.pdf.font_size_pt
+
+    def width(self, text):
+        key = (self._font_key(), text)
+        width = self._widths.get(key)
+        if width is None:
+            width = self._widths[key] = self.pdf.get_string_width(text)
+        return width
+
+    def split(self, text, max_width):
+        """Разбивает текст на строки не шире max_width (перенос по словам)."""
+        key = (self._font_key(), max_width, text)
+        lines = self._lines.get(key)
+        if lines is None:
+            lines = self._lines[key] = self._wrap(text, max_width)
+        return lines
+
+    def _wrap(self, text, max_width):
+        lines = []
+        space = self.width(' ')
+        for paragraph in text.split('\n'):
+            current, current_width = [], 0
+            for word in paragraph.split(' '):
+                word_width = self.width(word)
+
+                # Слово длиннее колонки режем по символам
+                if word_width > max_width:
+                    if current:
+                        lines.append(' '.join(current))
+                        current, current_width = [], 0
+                    chunks = self._break_word(word, max_width)
+                    lines.extend(chunks[:-1])
+                    word = chunks[-1]
+                    word_width = self.width(word)
+
+                extra = word_width + (space if current else 0)
+                if current and current_width + extra > max_width:
+                    lines.append(' '.join(current))
+                    current, current_width = [word], word_width
+                else:
+                    current.append(word)
+                    current_width += extra
+            lines.append(' '.join(current))
+        return lines
+
+    def _break_word(self, word, max_width):
+        chunks, start = [], 0
+        for end in range(1, len(word) + 1):
+            if end - start > 1 and self.width(word[start:end]) > max_width:
+                chunks.append(word[start:end - 1])
+                start = end - 1
+        chunks.append(word[start:])
+        return chunks
+
+
+class TableLayout:
+    """Таблица для FPDF с однопроходной раскладкой текста.
+
+    Ширины колонок считаются по выборке строк (не более sample_size) и
+    ограничиваются перцентилем, чтобы одно длинное значение не раздувало
+    колонку. Переносы вычисляются один раз на ячейку и используются и для
+    высоты строки, и для отрисовки.
+    """
+
+    header_height = 10
+
+    def __init__(self, pdf, columns, font_family='DejaVu', header_size=12, body_size=10,
+                 line_height=5, padding=2, sample_size=500, width_percentile=0.95, col_widths=None):
+        self.pdf = pdf
+        self.columns = columns
+        self.font_family = font_family
+        self.header_size = header_size
+        self.body_size = body_size
+        self.line_height = line_height
+        self.padding = padding
+        self.sample_size = sample_size
+        self.width_percentile = width_percentile
+        self.metrics = TextMetrics(pdf)
+        self.col_widths = col_widths
+
+    @staticmethod
+    def cell_text(row, key):
+        value = row.get(key)
+        return '' if value is None else str(value)
+
+    def sample(self, rows):
+        """Равномерная выборка строк для оценки ширины колонок."""
+        if len(rows) <= self.sample_size:
+            return rows
+        step = len(rows) / self.sample_size
+        return [rows[int(i * step)] for i in range(self.sample_size)]
+
+    def fit_columns(self, rows):
+        pdf = self.pdf
+        sample = self.sample(rows)
+        extra = 2 * self.padding + 4
+
+        widths = []
+        for title, key, _ in self.columns:
+            pdf.set_font(self.font_family, 'B', self.header_size)
+            header_width = self.metrics.width(title) + extra
+
+            pdf.set_font(self.font_family, '', self.body_size)
+            values = sorted(
+                max(self.metrics.width(line) for line in self.cell_text(row, key).split('\n'))
+                for row in sample
+            )
+            body_width = values[int((len(values) - 1) * self.width_percentile)] + extra if values else 0
+
+            widths.append(max(header_width, body_width))
+
+        # Автоматическое масштабирование под ширину страницы
+        total_width = sum(widths)
+        if total_width > pdf.epw:
+            scale_factor = pdf.epw / total_width * 0.95  # Небольшой запас
+            widths = [w * scale_factor for w in widths]
+
+        self.col_widths = widths
+        return widths
+
+    def render_header(self):
+        pdf = self.pdf
+        pdf.set_fill_color(220, 220, 220)
+        pdf.set_font(self.font_family, 'B', self.header_size)
+        for width, (title, _, _) in zip(self.col_widths, self.columns):
+            pdf.cell(width, self.header_height, title, border=1, align='C', fill=True)
+        pdf.ln()
+        pdf.set_font(self.font_family, '', self.body_size)
+
+    def split_row(self, row):
+        self.pdf.set_font(self.font_family, '', self.body_size)
+        return [
+            self.metrics.split(self.cell_text(row, key), width - 2 * self.padding)
+            for width, (_, key, _) in zip(self.col_widths, self.columns)
+        ]
+
+    def row_height(self, cells):
+        return max(len(lines) for lines in cells) * self.line_height + 2 * self.padding
+
+    def measure(self, rows):
+        """Высоты строк таблицы без отрисовки (для разбивки на страницы)."""
+        return [self.row_height(self.split_row(row)) for row in rows]
+
+    def render(self, rows, page_breaks=None):
+        """Рисует таблицу.
+
+        page_breaks - индексы строк, с которых начинается новая страница.
+        Если не переданы, страницы разбиваются по фактической высоте строк.
+        """
+        if self.col_widths is None:
+            self.fit_columns(rows)
+
+        pdf = self.pdf
+        # Разрывы страниц таблица делает сама, чтобы повторять заголовок
+        auto_page_break = pdf.auto_page_break
+        pdf.set_auto_page_break(False, margin=pdf.b_margin)
+
+        self.render_header()
+        inner_widths = [w - 2 * self.padding for w in self.col_widths]
+        fill = False
+
+        for index, row in enumerate(rows):
+            cells = self.split_row(row)
+            row_height = self.row_height(cells)
+
+            # Проверка на выход за границы страницы
+            if page_breaks is not None:
+                new_page = index in page_breaks
+            else:
+                new_page = pdf.get_y() + row_height > pdf.page_break_trigger
+            if new_page:
+                pdf.add_page()
+                self.render_header()
+
+            y_start = pdf.get_y()
+            x = pdf.l_margin
+            pdf.set_fill_color(245 if fill else 255)
+            for width, inner_width, lines in zip(self.col_widths, inner_widths, cells):
+                # Ячейка с фоном
+                pdf.set_xy(x, y_start)
+                pdf.cell(width, row_height, '', border=1, fill=fill)
+
+                # Текст ячейки по уже вычисленным строкам
+                for i, line in enumerate(lines):
+                    if line:
+                        pdf.set_xy(x + self.padding, y_start + self.padding + i * self.line_height)
+                        pdf.cell(inner_width, self.line_height, line)
+
+                x += width
+
+            pdf.set_xy(pdf.l_margin, y_start + row_height)
+            fill = not fill  # Чередуем цвет фона
+
+        pdf.set_auto_page_break(auto_page_break, margin=pdf.b_margin)
+
+
+def paginate(heights, first_page_top, page_top, page_bottom, header_height):
+    """Повторяет разбивку TableLayout.render: индексы строк, начинающих страницу."""
+    page_starts = []
+    y = first_page_top + header_height
+    for index, height in enumerate(heights):
+        if y + height > page_bottom:
+            page_starts.append(index)
+            y = page_top + header_height
+        y += height
+    return page_starts
+
+
+def _measure_chunk(columns, col_widths, rows):
+    pdf = new_document()
+    return TableLayout(pdf, columns, col_widths=col_widths).measure(rows)
+
+
+def _render_chunk(title, generated_at, columns, col_widths, rows, page_breaks, page_offset):
+    pdf = new_document(page_offset)
+    if title is not None:
+        render_title(pdf, title, generated_at)
+    TableLayout(pdf, columns, col_widths=col_widths).render(rows, page_breaks=set(page_breaks))
+    return bytes(pdf.output())
+
+
+def render_table_parallel(title, columns, rows, workers, chunk_rows):
+    """Рисует таблицу частями в пуле процессов.
+
+    Сначала воркеры считают высоты строк, затем строки разбиваются на
+    страницы и группируются в части, начинающиеся с новой страницы.
+    Каждая часть рисуется в отдельном процессе со своим смещением номеров
+    страниц. Возвращает список PDF-частей (bytes) и число страниц таблицы.
+    """
+    generated_at = datetime.now()
+
+    # Ширины колонок и геометрию страниц считаем один раз в родителе
+    probe = new_document()
+    col_widths = TableLayout(probe, columns).fit_columns(rows)
+    page_top = probe.t_margin
+    page_bottom = probe.page_break_trigger
+    render_title(probe, title, generated_at)
+    first_page_top = probe.get_y()
+
+    chunks = [rows[i:i + chunk_rows] for i in range(0, len(rows), chunk_rows)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        heights = []
+        for part in executor.map(_measure_chunk, [columns] * len(chunks), [col_widths] * len(chunks), chunks):
+            heights.extend(part)
+
+        page_starts = paginate(heights, first_page_top, page_top, page_bottom, TableLayout.header_height)
+        page_count = len(page_starts) + 1
+
+        # Части из целых страниц примерно по chunk_rows строк
+        bounds = [0]
+        for index in page_starts:
+            if index - bounds[-1] >= chunk_rows:
+                bounds.append(index)
+        bounds.append(len(rows))
+
+        futures = []
+        for start, end in zip(bounds, bounds[1:]):
+            breaks = [i - start for i in page_starts if start < i < end]
+            pages_before = sum(1 for i in page_starts if i <= start)
+            futures.append(executor.submit(
+                _render_chunk,
+                title if start == 0 else None,
+                generated_at,
+                columns,
+                col_widths,
+                rows[start:end],
+                breaks,
+                pages_before
+            ))
+        parts = [future.result() for future in futures]
+
+    return parts, page_count
+
+
+def merge_pdfs(parts, filename):
+    """Склеивает PDF-части в один файл (нужен пакет pypdf)."""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(io.BytesIO(part))
+    with open(filename, 'wb') as f:
+        writer.write(f)
@@ -0,0 +1,237 @@
+# app/perf.py
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.models import db, User, Project, ProjectUser, Task, TaskExecutor, Comment, Notification, \
+    NotificationCounter, Report, tasks_with_people, tasks_of_user, task_status_counts, comments_with_authors, \
+    history_with_users, projects_of_user, reports_with_generator
+
+perf_cli = AppGroup('perf', help='Проверки производительности.')
+
+
+def hot_queries(user_id, project_id, task_id):
+    """Запросы горячих маршрутов и таблицы, которые они должны читать по индексу."""
+    return [
+        ('Доска проекта', ['task'],
+         tasks_with_people().filter(Task.project_id == project_id)),
+        ('Статистика проектов', ['task'],
+         task_status_counts([project_id])),
+        ('Задачи менеджера', ['task'],
+         tasks_of_user(user_id, 'manager').order_by(Task.deadline.asc().nulls_last(), Task.id.asc()).limit(51)),
+        ('Задачи исполнителя', ['task_executor'],
+         tasks_of_user(user_id, 'executor').order_by(Task.deadline.asc().nulls_last(), Task.id.asc()).limit(51)),
+        ('Комментарии задачи', ['comment'],
+         comments_with_authors(task_id)),
+        ('Последние комментарии задачи', ['comment'],
+         comments_with_authors(task_id, newest_first=True).limit(51)),
+        ('История задачи', ['change_history'],
+         history_with_users(task_id).limit(31)),
+        ('Проекты пользователя', ['project_user'],
+         projects_of_user(user_id)),
+        ('Непрочитанные уведомления', ['notification'],
+         Notification.query.filter_by(recipient_id=user_id, is_read=False)),
+        ('Лента уведомлений', ['notification'],
+         Notification.query.filter_by(recipient_id=user_id).order_by(Notification.id.desc()).limit(31)),
+        ('Счетчик уведомлений', ['notification', 'notification_counter'],
+         db.session.query(NotificationCounter.unread).filter_by(user_id=user_id)),
+        ('Последние отчеты', ['report'],
+         reports_with_generator().order_by(Report.timestamp.desc()).limit(50)),
+        ('Очередь отчетов', ['report'],
+         db.session.query(Report.id).filter(Report.status == 'pending').order_by(Report.timestamp, Report.id).limit(2)),
+    ]
+
+
+def explain(query):
+    """Возвращает список (таблица, описание) полных просмотров таблиц в плане запроса."""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    # Параметры подставляются в текст: EXPLAIN не принимает развернутые IN (...)
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'postgresql':
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans, nodes = [], [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                scans.append((node['Relation Name'], f"Seq Scan on {node['Relation Name']}"))
+            nodes.extend(node.get('Plans', []))
+        return scans
+
+    if dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).all()
+        scans = []
+        for row in rows:
+            detail = row[-1]
+            # "SCAN task" - полный просмотр, "SCAN task USING INDEX ..." - обход индекса
+            if detail.startswith('SCAN ') and ' USING ' not in detail:
+                scans.append((detail.split()[1], detail))
+        return scans
+
+    raise click.ClickException(f'EXPLAIN для {dialect.name} не поддерживается')
+
+
+def seed_dataset(size):
+    """Заполняет базу синтетическими данными: size задач и связанные записи."""
+    now = datetime.now()
+    user_count = max(10, size // 100)
+    project_count = max(5, size // 200)
+
+    users = [{'name': f'perf user {i}', 'email': f'perf{i}@example.invalid', 'password_hash': '-'}
+             for i in range(user_count)]
+    db.session.execute(db.insert(User), users)
+    user_ids = [row.id for row in db.session.query(User.id).filter(User.email.like('perf%@example.invalid'))]
+
+    db.session.execute(db.insert(Project), [{'name': f'perf project {i}', 'created_at': now}
+                                           for i in range(project_count)])
+    project_ids = [row.id for row in db.session.query(Project.id).filter(Project.name.like('perf project %'))]
+
+    db.session.execute(db.insert(ProjectUser), [
+        {'project_id': project_id, 'user_id': user_id, 'role': 'member'}
+        for project_id in project_ids
+        for user_id in random.sample(user_ids, min(5, len(user_ids)))
+    ])
+
+    statuses = ['To Do', 'In Progress', 'Done']
+    db.session.execute(db.insert(Task), [{
+        'title': f'perf task {i}',
+        'status': statuses[i % 3],
+        'created_at': now,
+        'deadline': now + timedelta(days=i % 60 - 30) if i % 4 else None,
+        'manager_id': random.choice(user_ids),
+        'project_id': random.choice(project_ids)
+    } for i in range(size)])
+    task_ids = [row.id for row in db.session.query(Task.id).filter(Task.title.like('perf task %'))]
+
+    db.session.execute(db.insert(TaskExecutor), [
+        {'task_id': task_id, 'user_id': random.choice(user_ids)} for task_id in task_ids
+    ])
+    db.session.execute(db.insert(Comment), [
+        {'content': 'perf', 'timestamp': now, 'author_id': random.choice(user_ids), 'task_id': random.choice(task_ids)}
+        for _ in range(size)
+    ])
+    db.session.execute(db.insert(Notification), [
+        {'message': 'perf', 'timestamp': now, 'is_read': i % 5 != 0, 'recipient_id': random.choice(user_ids)}
+        for i in range(size)
+    ])
+    db.session.execute(db.insert(Report), [
+        {'report_type': 'tasks', 'timestamp': now - timedelta(minutes=i), 'status': 'completed', 'attempts': 1}
+        for i in range(size // 10)
+    ])
+
+    # Свежая статистика для планировщика
+    db.session.execute(db.text('ANALYZE'))
+    return user_ids[0], project_ids[0], task_ids[0]
+
+
+@perf_cli.command('check-plans')
+@click.option('--seed', type=int, default=0,
+              help='Добавить синтетические данные (число задач) на время проверки; изменения откатываются.')
+def check_plans_command(seed):
+    """Проверяет через EXPLAIN, что горячие запросы используют индексы."""
+    try:
+        if seed:
+            click.echo(f'Seeding {seed} tasks...')
+            user_id, project_id, task_id = seed_dataset(seed)
+        else:
+            user_id = db.session.query(db.func.min(User.id)).scalar() or 1
+            project_id = db.session.query(db.func.min(Project.id)).scalar() or 1
+            task_id = db.session.query(db.func.min(Task.id)).scalar() or 1
+
+        failed = 0
+        for name, tables, query in hot_queries(user_id, project_id, task_id):
+            scans = [detail for table, detail in explain(query) if table in tables]
+            if scans:
+                failed += 1
+                click.echo(f'FAIL  {name}: ' + '; '.join(scans))
+            else:
+                click.echo(f'ok    {name}')
+    finally:
+        db.session.rollback()
+
+    if failed:
+        raise click.ClickException(f'{failed} queries use sequential scans')
+
+
+# Выполняется в отдельном интерпретаторе: холодный старт без уже загруженных модулей
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get(sys.argv[1]).status_code
+finished = time.perf_counter()
+print(json.dumps({'create_app_ms': (created - started) * 1000, 'first_request_ms': (finished - created) * 1000,
+                  'status': status, 'modules': len(sys.modules)}))
+"""
+
+
+def measure_startup(root, path='/auth', import_time=False):
+    """Холодный старт в новом процессе: импорт и create_app(), затем первый запрос к path."""
+    import subprocess
+
+    command = [sys.executable] + (['-X', 'importtime'] if import_time else []) + ['-c', STARTUP_SCRIPT, path]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run(command, cwd=root, env=env, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise click.ClickException(f'Startup failed:\n{result.stderr.strip()}')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(import_log, limit):
+    """Модули с наибольшим собственным временем импорта из вывода python -X importtime."""
+    modules = []
+    for line in import_log.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            modules.append((int(self_us), name.strip()))
+    return sorted(modules, reverse=True)[:limit]
+
+
+@perf_cli.command('startup')
+@click.option('--runs', type=int, default=5, show_default=True, help='Число холодных запусков.')
+@click.option('--path', default='/auth', show_default=True, help='Адрес первого запроса.')
+@click.option('--max-ms', type=float, default=None,
+              help='Допустимая медиана create_app() + первого запроса, мс (по умолчанию STARTUP_BUDGET_MS).')
+@click.option('--imports', 'show_imports', type=int, default=0, help='Показать N самых медленных импортов.')
+def startup_command(runs, path, max_ms, show_imports):
+    """Измеряет холодный старт воркера и проверяет бюджет времени."""
+    import statistics
+
+    root = os.path.dirname(current_app.root_path)
+    budget = max_ms if max_ms is not None else current_app.config['STARTUP_BUDGET_MS']
+
+    totals = []
+    for run in range(1, runs + 1):
+        sample, _ = measure_startup(root, path)
+        total = sample['create_app_ms'] + sample['first_request_ms']
+        totals.append(total)
+        click.echo(f"run {run}: create_app {sample['create_app_ms']:7.1f} ms, first request "
+                   f"{sample['first_request_ms']:7.1f} ms (HTTP {sample['status']}), {sample['modules']} modules")
+
+    median = statistics.median(totals)
+    click.echo(f'median {median:.1f} ms, min {min(totals):.1f} ms, budget {budget:.0f} ms')
+
+    if show_imports:
+        _, import_log = measure_startup(root, path, import_time=True)
+        for self_us, name in slowest_imports(import_log, show_imports):
+            click.echo(f'{self_us / 1000:8.1f} ms  {name}')
+
+    if budget and median > budget:
+        raise click.ClickException(f'Startup takes {median:.1f} ms, budget is {budget:.0f} ms')
+
+
+def init_app(app):
+    app.cli.add_command(perf_cli)
@@ -0,0 +1,292 @@
+# app/reports.py
+import json
+import logging
+import os
+from datetime import datetime
+
+from flask import current_app
+
+from app.database import read_replica
+from app.models import db, Report, tasks_with_people, projects_with_members, users_with_activity, project_task_stats
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки строк при потоковой выгрузке из БД
+REPORT_BATCH_SIZE = 1000
+
+
+def iter_batches(query, batch_size=REPORT_BATCH_SIZE):
+    """Читает результат запроса пачками через серверный курсор.
+
+    Сессия хранит загруженные объекты по слабым ссылкам, поэтому обработанные
+    пачки освобождаются и потребление памяти не зависит от размера таблицы.
+    """
+    result = db.session.execute(query.statement.execution_options(yield_per=batch_size))
+    for batch in result.scalars().partitions():
+        yield batch
+
+
+def iter_task_records():
+    for batch in iter_batches(tasks_with_people()):
+        for t in batch:
+            yield {
+                'id': t.id,
+                'title': t.title,
+                'status': t.status,
+                'project': t.project.name if t.project else None,
+                'created_at': t.created_at.strftime('%d.%m.%Y %H:%M') if t.created_at else None,
+                'deadline': t.deadline.strftime('%d.%m.%Y') if t.deadline else None,
+                'manager': t.manager.name if t.manager else None,
+                'executors': ', '.join([e.name for e in t.executors])
+            }
+
+
+def iter_project_records():
+    for batch in iter_batches(projects_with_members()):
+        stats = project_task_stats(p.id for p in batch)
+        for p in batch:
+            yield {
+                'id': p.id,
+                'name': p.name,
+                'description': p.description,
+                'created_at': p.created_at.strftime('%d.%m.%Y %H:%M') if p.created_at else None,
+                'deadline': p.deadline.strftime('%d.%m.%Y') if p.deadline else None,
+                'total_tasks': stats[p.id]['total_tasks'],
+                'tasks_by_status': stats[p.id]['tasks_by_status'],
+                'participants': ', '.join(
+                    [f"{pu.user.name} ({pu.role})" for pu in p.user_associations])
+            }
+
+
+def iter_user_records():
+    for batch in iter_batches(users_with_activity()):
+        for u in batch:
+            yield {
+                'id': u.id,
+                'name': u.name,
+                'email': u.email,
+                'total_projects': len(u.projects),
+                'total_tasks_assigned': len(u.assigned_tasks),
+                'tasks_by_status': {
+                    'todo': len([t for t in u.assigned_tasks if t.status == 'To Do']),
+                    'in_progress': len([t for t in u.assigned_tasks if t.status == 'In Progress']),
+                    'done': len([t for t in u.assigned_tasks if t.status == 'Done'])
+                }
+            }
+
+
+def project_charts(data):
+    return [
+        {
+            'type': 'pie',
+            'data': {
+                'labels': ['To Do', 'In Progress', 'Done'],
+                'values': [
+                    sum(p['tasks_by_status']['todo'] for p in data),
+                    sum(p['tasks_by_status']['in_progress'] for p in data),
+                    sum(p['tasks_by_status']['done'] for p in data)
+                ],
+                'title': 'Распределение задач по статусам'
+            }
+        }
+    ]
+
+
+def user_charts(data):
+    return [
+        {
+            'type': 'bar',
+            'data': {
+                'labels': [u['name'] for u in data],
+                'values': [u['total_tasks_assigned'] for u in data],
+                'title': 'Количество задач на пользователя'
+            }
+        }
+    ]
+
+
+# Описание типов отчетов: источник строк и оформление PDF
+REPORT_TYPES = {
+    'tasks': {
+        'title': 'Отчет по задачам',
+        'records': iter_task_records,
+        'columns': [
+            ('ID', 'id', 10),
+            ('Название', 'title', 50),
+            ('Статус', 'status', 20),
+            ('Проект', 'project', 30),
+            ('Дата создания', 'created_at', 25),
+            ('Дедлайн', 'deadline', 20),
+            ('Менеджер', 'manager', 30),
+            ('Исполнители', 'executors', 40)
+        ],
+        'charts': None
+    },
+    'projects': {
+        'title': 'Отчет по проектам',
+        'records': iter_project_records,
+        'columns': [
+            ('ID', 'id', 10),
+            ('Название', 'name', 40),
+            ('Описание', 'description', 60),
+            ('Дата создания', 'created_at', 25),
+            ('Дедлайн', 'deadline', 20),
+            ('Всего задач', 'total_tasks', 20),
+            ('Участники', 'participants', 60)
+        ],
+        'charts': project_charts
+    },
+    'users': {
+        'title': 'Отчет по пользователям',
+        'records': iter_user_records,
+        'columns': [
+            ('ID', 'id', 10),
+            ('Имя', 'name', 30),
+            ('Email', 'email', 50),
+            ('Дата регистрации', 'registration_date', 25),
+            ('Последний вход', 'last_login', 25),
+            ('Проектов', 'total_projects', 20),
+            ('Задач', 'total_tasks_assigned', 20)
+        ],
+        'charts': user_charts
+    }
+}
+
+# Расширения файлов и MIME-типы форматов выгрузки
+REPORT_FORMATS = {
+    'json': ('json', 'application/json'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'pdf': ('pdf', 'application/pdf')
+}
+
+
+def write_json(records, f):
+    """Пишет записи JSON-массивом с отступами, по одной записи за раз."""
+    first = True
+    for record in records:
+        f.write('[\n' if first else ',\n')
+        first = False
+        item = json.dumps(record, ensure_ascii=False, indent=2)
+        f.write('  ' + item.replace('\n', '\n  '))
+    f.write('[]' if first else '\n]')
+
+
+def write_ndjson(records, f):
+    """Пишет записи в формате NDJSON: один компактный JSON-объект на строку."""
+    for record in records:
+        f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        f.write('\n')
+
+
+def build_report(report_id):
+    """Формирует файл отчета и возвращает путь к нему.
+
+    Вызывается воркером фоновых задач внутри контекста приложения.
+    Статус записи Report здесь не меняется: этим занимается app.jobs.
+    """
+    report = Report.query.get(report_id)
+    if not report:
+        raise LookupError(f'Отчет {report_id} не найден')
+
+    if report.report_type == 'backup':
+        from app.backup import run_backup_report
+        return run_backup_report(report)
+    if report.report_type == 'restore':
+        from app.backup import run_restore_report
+        return run_restore_report(report)
+
+    spec = REPORT_TYPES.get(report.report_type)
+    if spec is None:
+        raise ValueError(f'Неизвестный тип отчета: {report.report_type}')
+
+    report_format = report.format or 'json'
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f'Неизвестный формат отчета: {report_format}')
+
+    # Создаем директорию для отчетов, если ее нет
+    reports_dir = os.path.join(current_app.instance_path, 'reports')
+    os.makedirs(reports_dir, exist_ok=True)
+
+    extension = REPORT_FORMATS[report_format][0]
+    filename = f"{report.report_type}_{report.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    file_path = os.path.join(reports_dir, f"{filename}.{extension}")
+
+    # Сама запись отчета читается выше с основной базы, данные - с реплики, если она есть
+    records = spec['records']()
+
+    if report_format == 'pdf':
+        # PDF-таблице нужны все строки сразу (ширина столбцов, графики)
+        with read_replica():
+            data = list(records)
+        generate_pdf_report(
+            title=spec['title'],
+            data=data,
+            filename=file_path,
+            columns=spec['columns'],
+            charts=spec['charts'](data) if spec['charts'] else None,
+            workers=current_app.config['PDF_RENDER_WORKERS'] or os.cpu_count() or 1,
+            parallel_min_rows=current_app.config['PDF_PARALLEL_MIN_ROWS'],
+            chunk_rows=current_app.config['PDF_CHUNK_ROWS'],
+            chart_cache_dir=os.path.join(current_app.instance_path, 'chart_cache')
+        )
+        return file_path
+
+    # Пишем во временный файл, чтобы прерванная попытка не оставила обрезанный отчет
+    partial_path = file_path + '.part'
+    try:
+        with open(partial_path, 'w', encoding='utf-8') as f, read_replica():
+            if report_format == 'ndjson':
+                write_ndjson(records, f)
+            else:
+                write_json(records, f)
+    except BaseException:
+        # У каждой попытки свое имя файла - недописанный файл удаляем сразу
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass
+        raise
+    os.replace(partial_path, file_path)
+
+    return file_path
+
+
+def generate_pdf_report(title, data, filename, columns, charts=None,
+                        workers=1, parallel_min_rows=None, chunk_rows=5000, chart_cache_dir=None):
+    """Формирует PDF-отчет.
+
+    Если строк не меньше parallel_min_rows и доступно больше одного процесса,
+    таблица рисуется частями в пуле процессов и склеивается (нужен pypdf),
+    иначе документ строится целиком в текущем процессе. Графики кэшируются
+    по содержимому (app.charts), chart_cache_dir включает кэш на диске.
+    """
+    from app import pdf as pdf_layout
+    from app.charts import render_charts
+
+    if workers > 1 and parallel_min_rows is not None and len(data) >= parallel_min_rows:
+        try:
+            import pypdf  # noqa: F401
+        except ImportError:
+            logger.warning('pypdf is not installed, rendering %s rows in a single process', len(data))
+        else:
+            parts, page_count = pdf_layout.render_table_parallel(title, columns, data, workers, chunk_rows)
+            if charts:
+                doc = pdf_layout.new_document(page_offset=page_count)
+                render_charts(doc, charts, chart_cache_dir)
+                parts.append(bytes(doc.output()))
+            pdf_layout.merge_pdfs(parts, filename)
+            return
+
+    doc = pdf_layout.new_document()
+    pdf_layout.render_title(doc, title, datetime.now())
+
+    # Таблица данных
+    pdf_layout.TableLayout(doc, columns).render(data)
+
+    # Графики
+    if charts:
+        doc.add_page()
+        render_charts(doc, charts, chart_cache_dir)
+
+    doc.output(filename)
+
@@ -1,22 +1,33 @@
 # app/routes.py
+import base64
+import zlib
 import json
 import os
-import shutil
-import subprocess
-import tempfile
-from pathlib import Path
 
-from flask import render_template, redirect, url_for, flash, Blueprint, request, abort, current_app, send_from_directory
+from flask import render_template, redirect, url_for, flash, Blueprint, request, abort, current_app, send_from_directory, \
+    Response, stream_with_context
 from flask_login import current_user, login_user, login_required, logout_user
+from werkzeug.utils import secure_filename
 
+from app.access import is_project_member, project_role
+from app.database import pool_stats, read_replica
+from app.events import publish_board_event, project_channel
+from app.history import record_task_changes
 from app.forms import RegisterForm, LoginForm
-from app.models import User, db, ProjectUser, Project, Task, TaskExecutor, Comment, Report
+from app.fragments import task_card
+from app.jobs import wake_report_workers
+from app.notifications import enqueue as enqueue_notification, enqueue_many as enqueue_notifications, \
+    mark_read, unread_count
+from app.reports import REPORT_FORMATS, REPORT_TYPES
+from app.search import search_terms, search_tasks
+from app.task_import import IMPORT_FORMATS, ImportFormatError, detect_format, import_tasks, parse_rows
+from app.models import User, db, ProjectUser, Project, Task, TaskExecutor, Comment, ChangeHistory, Report, \
+    Notification, tasks_with_project, tasks_with_people, projects_of_user, project_with_members, \
+    comments_with_authors, history_with_users, reports_with_generator, project_task_stats, \
+    tasks_of_user, bump_board_revision, touch_tasks, TASK_STATUSES
 from flask import jsonify
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
-from fpdf import FPDF
-from datetime import datetime
-import tempfile
 bp = Blueprint('taskflow', __name__)
 
 
@@ -26,17 +37,19 @@ def index():
         return redirect(url_for('taskflow.auth'))
 
     # Получаем задачи, где пользователь исполнитель или менеджер
-    executor_tasks = Task.query.join(TaskExecutor).filter(TaskExecutor.user_id == current_user.id).all()
-    manager_tasks = Task.query.filter_by(manager_id=current_user.id).all()
+    executor_tasks = tasks_with_project().join(TaskExecutor).filter(TaskExecutor.user_id == current_user.id).all()
+    manager_tasks = tasks_with_project().filter(Task.manager_id == current_user.id).all()
 
-    # Получаем проекты пользователя
-    user_projects = current_user.projects
+    # Получаем проекты пользователя и число задач в них
+    user_projects = projects_of_user(current_user.id).all()
+    project_stats = project_task_stats(p.id for p in user_projects)
 
     return render_template(
         'main.html',
         executor_tasks=executor_tasks,
         manager_tasks=manager_tasks,
-        user_projects=user_projects
+        user_projects=user_projects,
+        project_stats=project_stats
     )
 
 @bp.route('/auth', methods=['GET', 'POST'])
@@ -112,14 +125,18 @@ def create_task():
         )
         db.session.add(task)
 
-        # Устанавливаем исполнителей
-        for executor_id in executor_ids:
-            executor = User.query.get(executor_id)
-            if executor:
-                task_executor = TaskExecutor(task_id=task.id, user_id=executor_id)
-                db.session.add(task_executor)
+        # Устанавливаем исполнителей: существующих пользователей находим одним запросом
+        valid_ids = {row.id for row in db.session.query(User.id).filter(
+            User.id.in_([int(executor_id) for executor_id in executor_ids if executor_id.isdigit()])
+        )}
+        for executor_id in valid_ids:
+            task.executors_link.append(TaskExecutor(user_id=executor_id))
 
+        revision = bump_board_revision(project_id)
+        enqueue_notification('task_assigned', task.id, current_user.id, user_ids=sorted(valid_ids))
         db.session.commit()
+        publish_board_event(task.project_id, 'task_created', revision,
+                            task_id=task.id, status=status_key(task.status), html=render_task_card(task))
         flash('Задача успешно создана!', 'success')
         return redirect(url_for('taskflow.index'))
 
@@ -128,6 +145,39 @@ def create_task():
     return render_template('task_create.html', user_projects=user_projects)
 
 
+@bp.route('/api/tasks/import', methods=['POST'])
+@login_required
+def import_tasks_api():
+    # Файл из формы или тело запроса; формат - параметр format, расширение файла или Content-Type
+    upload = request.files.get('file')
+    if upload:
+        payload = upload.read()
+        fmt = request.args.get('format') or detect_format(upload.filename, upload.content_type)
+    else:
+        payload = request.get_data()
+        fmt = request.args.get('format') or detect_format(content_type=request.content_type)
+
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': 'Укажите формат: json или csv'}), 400
+
+    try:
+        rows = parse_rows(payload, fmt)
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Импортировать можно только в проекты, где пользователь участник
+    allowed_project_ids = [row.project_id for row in db.session.query(ProjectUser.project_id).filter(
+        ProjectUser.user_id == current_user.id
+    )]
+    result = import_tasks(rows, current_user.id, allowed_project_ids)
+
+    return jsonify({
+        'created': result['created'],
+        'failed': len(result['errors']),
+        'errors': result['errors']
+    })
+
+
 @bp.route('/create_project', methods=['GET', 'POST'])
 @login_required
 def create_project():
@@ -202,13 +252,13 @@ def create_project():
 @bp.route('/api/project/<int:id>/participants')
 @login_required
 def get_project_participants(id):
-    project = Project.query.get_or_404(id)
+    project = project_with_members(id).first_or_404()
     # Проверяем, что текущий пользователь — участник проекта
     is_member = any(assoc.user_id == current_user.id for assoc in project.user_associations)
     if not is_member:
         return jsonify({'error': 'Доступ запрещён'}), 403
 
-    participants = [{'id': user.id, 'name': user.name} for user in project.users]
+    participants = [{'id': assoc.user.id, 'name': assoc.user.name} for assoc in project.user_associations]
     return jsonify({'participants': participants})
 
 
@@ -235,7 +285,7 @@ def projects():
 @bp.route('/api/project/<int:id>/participants_with_roles')
 @login_required
 def get_project_participants_with_roles(id):
-    project = Project.query.get_or_404(id)
+    project = project_with_members(id).first_or_404()
 
     # Проверяем, что текущий пользователь — участник проекта
     is_member = any(assoc.user_id == current_user.id for assoc in project.user_associations)
@@ -245,7 +295,7 @@ def get_project_participants_with_roles(id):
     # Получаем информацию об участниках с ролями
     participants = []
     for assoc in project.user_associations:
-        user = User.query.get(assoc.user_id)
+        user = assoc.user
         participants.append({
             'id': user.id,
             'name': user.name,
@@ -265,52 +315,293 @@ def get_project_stats(id):
     project = Project.query.get_or_404(id)
 
     # Проверка прав доступа
-    if not any(assoc.user_id == current_user.id for assoc in project.user_associations):
+    if not is_project_member(project.id):
         return jsonify({'error': 'Доступ запрещён'}), 403
 
-    return jsonify({
-        'total_tasks': len(project.tasks),
-        'tasks_by_status': {
-            'todo': len([t for t in project.tasks if t.status == 'To Do']),
-            'in_progress': len([t for t in project.tasks if t.status == 'In Progress']),
-            'done': len([t for t in project.tasks if t.status == 'Done'])
-        }
-    })
+    return jsonify(project_task_stats([project.id])[project.id])
+
+
+PROJECT_STATS_MAX_IDS = 200
+
+
+@bp.route('/api/projects/stats')
+@login_required
+def get_projects_stats():
+    try:
+        ids = {int(value) for value in request.args.get('ids', '').split(',') if value.strip()}
+    except ValueError:
+        return jsonify({'error': 'Некорректный список проектов'}), 400
+
+    if len(ids) > PROJECT_STATS_MAX_IDS:
+        return jsonify({'error': f'Не более {PROJECT_STATS_MAX_IDS} проектов за запрос'}), 400
+
+    # Статистику отдаем только по проектам, где пользователь участник
+    allowed_ids = [row.project_id for row in db.session.query(ProjectUser.project_id).filter(
+        ProjectUser.user_id == current_user.id,
+        ProjectUser.project_id.in_(ids)
+    )] if ids else []
+
+    stats = project_task_stats(allowed_ids)
+    return jsonify({'stats': {str(project_id): value for project_id, value in stats.items()}})
 
 
 @bp.route('/tasks')
 @login_required
+@read_replica()
 def tasks():
-    # Получаем задачи, где пользователь исполнитель или менеджер
-    executor_tasks = Task.query.join(TaskExecutor).filter(TaskExecutor.user_id == current_user.id).all()
-    manager_tasks = Task.query.filter_by(manager_id=current_user.id).all()
+    # Сами задачи подгружаются страницами через /api/tasks
+    user_projects = current_user.projects
+    return render_template('tasks.html', user_projects=user_projects)
 
-    # Объединяем и убираем дубликаты
-    all_tasks = list(set(executor_tasks + manager_tasks))
 
-    # Получаем проекты пользователя для фильтра
-    user_projects = current_user.projects
+TASKS_PAGE_SIZE = 50
+TASKS_MAX_PAGE_SIZE = 200
+
+
+def page_limit(default, maximum):
+    """Размер страницы из ?limit=: по умолчанию default, не меньше 1 и не больше maximum."""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit or default, maximum))
+
+
+def encode_cursor(*values):
+    """Упаковывает ключ последней строки страницы в непрозрачную строку."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, size):
+    """Распаковывает курсор; возвращает None, если он повреждён."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+@bp.route('/api/tasks')
+@login_required
+@read_replica()
+def list_tasks():
+    user_id = current_user.id
+
+    # Роль пользователя в задаче
+    query = tasks_of_user(user_id, request.args.get('role', 'all'))
+
+    status = request.args.get('status', 'all')
+    if status in TASK_STATUSES:
+        query = query.filter(Task.status == TASK_STATUSES[status])
+
+    project_id = request.args.get('project', 'all')
+    if project_id != 'all':
+        if not project_id.isdigit():
+            return jsonify({'error': 'Некорректный проект'}), 400
+        query = query.filter(Task.project_id == int(project_id))
+
+    # Фильтр по дедлайну считается относительно начала текущего дня
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    deadline = request.args.get('deadline', 'all')
+    if deadline == 'overdue':
+        query = query.filter(Task.deadline < today)
+    elif deadline == 'today':
+        query = query.filter(Task.deadline >= today, Task.deadline < today + timedelta(days=1))
+    elif deadline == 'week':
+        query = query.filter(Task.deadline >= today, Task.deadline < today + timedelta(days=7))
+    elif deadline == 'none':
+        query = query.filter(Task.deadline.is_(None))
+
+    # Keyset-пагинация по (deadline, id), задачи без дедлайна идут в конце
+    cursor = request.args.get('cursor')
+    if cursor:
+        values = decode_cursor(cursor, 2)
+        if values is None or not isinstance(values[1], int):
+            return jsonify({'error': 'Некорректный курсор'}), 400
+        last_deadline, last_id = values
+        if last_deadline is None:
+            query = query.filter(Task.deadline.is_(None), Task.id > last_id)
+        else:
+            try:
+                last_deadline = datetime.fromisoformat(last_deadline)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Некорректный курсор'}), 400
+            query = query.filter(db.or_(
+                Task.deadline > last_deadline,
+                db.and_(Task.deadline == last_deadline, Task.id > last_id),
+                Task.deadline.is_(None)
+            ))
+
+    limit = page_limit(TASKS_PAGE_SIZE, TASKS_MAX_PAGE_SIZE)
+    page = query.order_by(Task.deadline.asc().nulls_last(), Task.id.asc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1].deadline, page[-1].id)
+
+    return jsonify({
+        'tasks': [{
+            'id': task.id,
+            'title': task.title,
+            'description': task.description,
+            'status': task.status,
+            'priority': task.priority,
+            'deadline': task.deadline.isoformat() if task.deadline else None,
+            'project': {
+                'id': task.project.id,
+                'name': task.project.name
+            } if task.project else None,
+            'role': 'manager' if task.manager_id == user_id else 'executor'
+        } for task in page],
+        'next_cursor': next_cursor
+    })
+
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+@bp.route('/api/search')
+@login_required
+@read_replica()
+def search():
+    """Полнотекстовый поиск задач по названию, описанию и комментариям."""
+    user_id = current_user.id
+    terms = search_terms(request.args.get('q', ''))
+    if not terms:
+        return jsonify({'error': 'Пустой поисковый запрос'}), 400
+
+    project_id = request.args.get('project', 'all')
+    if project_id == 'all':
+        project_id = None
+    elif project_id.isdigit():
+        project_id = int(project_id)
+    else:
+        return jsonify({'error': 'Некорректный проект'}), 400
+
+    # Keyset-пагинация по (rank, id)
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor, 2)
+        if after is None or not isinstance(after[0], (int, float)) or not isinstance(after[1], int):
+            return jsonify({'error': 'Некорректный курсор'}), 400
+
+    limit = page_limit(SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE)
+    page = search_tasks(user_id, terms, project_id, after, limit)
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1].rank, page[-1].task_id)
+
+    ids = [row.task_id for row in page]
+    tasks = {task.id: task for task in tasks_with_project().filter(Task.id.in_(ids))} if ids else {}
+    executor_of = {row.task_id for row in db.session.query(TaskExecutor.task_id).filter(
+        TaskExecutor.task_id.in_(ids),
+        TaskExecutor.user_id == user_id
+    )} if ids else set()
+
+    results = []
+    for row in page:
+        task = tasks.get(row.task_id)
+        if task is None:  # удалена между запросами
+            continue
+        if task.manager_id == user_id:
+            role = 'manager'
+        else:
+            role = 'executor' if task.id in executor_of else 'member'
+        results.append({
+            'id': task.id,
+            'title': task.title,
+            'description': task.description,
+            'status': task.status,
+            'priority': task.priority,
+            'deadline': task.deadline.isoformat() if task.deadline else None,
+            'project': {
+                'id': task.project.id,
+                'name': task.project.name
+            } if task.project else None,
+            'role': role,
+            'rank': row.rank
+        })
+
+    return jsonify({
+        'tasks': results,
+        'next_cursor': next_cursor
+    })
+
+
+def task_version(task_id):
+    """Версия задачи и поля для проверки доступа - один запрос без связей, иначе 404."""
+    version = db.session.query(
+        Task.project_id, Task.manager_id, Task.revision, Task.updated_at
+    ).filter(Task.id == task_id).first()
+    if version is None:
+        abort(404)
+    return version
+
+
+def task_etag(kind, task_id, version):
+    """Сильный ETag ресурса задачи; параметры запроса тоже входят в ключ.
+
+    Ревизия задачи растет и при переименовании ее людей и проекта (app/models.py).
+    """
+    etag = f'{kind}-{task_id}-{version.revision}'
+    if request.query_string:
+        etag += f'-{zlib.crc32(request.query_string):08x}'
+    return etag
+
+
+def is_not_modified(etag, last_modified):
+    # If-None-Match важнее If-Modified-Since (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
 
-    # Передаем текущую дату в шаблон
-    return render_template('tasks.html', tasks=all_tasks, user_projects=user_projects, datetime=datetime)
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Браузер хранит ответ, но перед использованием всегда сверяет ETag
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag, last_modified):
+    return with_validators(current_app.response_class(status=304), etag, last_modified)
 
 
 @bp.route('/api/task/<int:id>/people')
 @login_required
 def get_task_people(id):
-    task = Task.query.get_or_404(id)
+    version = task_version(id)
 
-    # Проверка прав доступа
-    is_executor = any(executor.user_id == current_user.id for executor in task.executors_link)
-    is_manager = task.manager_id == current_user.id
+    # Проверка прав доступа без загрузки связей
+    is_manager = version.manager_id == current_user.id
+    is_executor = is_manager or db.session.query(db.exists().where(
+        TaskExecutor.task_id == id,
+        TaskExecutor.user_id == current_user.id
+    )).scalar()
 
     if not (is_executor or is_manager):
         return jsonify({'error': 'Доступ запрещён'}), 403
 
+    etag = task_etag('people', id, version)
+    if is_not_modified(etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+
+    task = tasks_with_people().filter(Task.id == id).first_or_404()
+
     # Получаем менеджера
     manager = None
-    if task.manager_id:
-        manager_user = User.query.get(task.manager_id)
+    if task.manager:
+        manager_user = task.manager
         manager = {
             'id': manager_user.id,
             'name': manager_user.name,
@@ -326,49 +617,114 @@ def get_task_people(id):
             'email': executor.email
         })
 
-    return jsonify({
+    return with_validators(jsonify({
         'manager': manager,
         'executors': executors
-    })
+    }), etag, version.updated_at)
 
 
 @bp.route('/board/<int:project_id>')
 @login_required
+@read_replica()
 def board(project_id):
     project = Project.query.get_or_404(project_id)
 
     # Проверка, что пользователь имеет доступ к проекту
-    if not any(p.id == project_id for p in current_user.projects):
+    if not is_project_member(project_id):
         return abort(403)
 
     # Группируем задачи по статусам
+    project_tasks = tasks_with_people().filter(Task.project_id == project_id).order_by(
+        Task.position.asc().nulls_last(), Task.id
+    ).all()
     tasks_by_status = {
-        'todo': [t for t in project.tasks if t.status == 'To Do'],
-        'in_progress': [t for t in project.tasks if t.status == 'In Progress'],
-        'done': [t for t in project.tasks if t.status == 'Done']
+        'todo': [t for t in project_tasks if t.status == 'To Do'],
+        'in_progress': [t for t in project_tasks if t.status == 'In Progress'],
+        'done': [t for t in project_tasks if t.status == 'Done']
     }
 
-    # Добавляем информацию о днях до дедлайна
-    for status, tasks in tasks_by_status.items():
-        for task in tasks:
-            if task.deadline:
-                task.days_remaining = (task.deadline.date() - datetime.now().date()).days
-            else:
-                task.days_remaining = float('inf')
+    # Карточки (и дни до дедлайна) берутся из кэша фрагментов: task_card в board.html
+    return render_template('board.html', project=project, tasks_by_status=tasks_by_status,
+                           max_moves=BOARD_MAX_MOVES)
+
+
+def render_task_card(task):
+    """Разметка карточки задачи для доски (та же, что в board.html)."""
+    return str(task_card(task))
+
 
-    return render_template('board.html', project=project, tasks_by_status=tasks_by_status)
+def status_key(status):
+    """'In Progress' -> 'in_progress': ключ колонки доски по статусу из БД."""
+    for key, value in TASK_STATUSES.items():
+        if value == status:
+            return key
+    return status
+
+
+SSE_KEEPALIVE_INTERVAL = 15
+
+
+@bp.route('/api/project/<int:project_id>/events')
+@login_required
+def board_events(project_id):
+    if not is_project_member(project_id):
+        return jsonify({'error': 'Доступ запрещён'}), 403
+
+    # Сначала подписка, потом ревизия: изменение между ними придет событием, а не потеряется
+    subscription = current_app.extensions['event_broker'].subscribe(project_channel(project_id))
+    revision = db.session.query(Project.board_revision).filter(Project.id == project_id).scalar()
+    if revision is None:
+        subscription.close()
+        abort(404)
+    # Соединение с БД потоку событий не нужно
+    db.session.remove()
+
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('since', ''))
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            # Клиент переподключился и мог пропустить изменения - пусть перечитает доску
+            if last_event_id.isdigit() and int(last_event_id) < revision:
+                yield f'event: resync\ndata: {json.dumps({"revision": revision})}\n\n'
+
+            while True:
+                event = subscription.get(timeout=SSE_KEEPALIVE_INTERVAL)
+                if subscription.overflowed:
+                    # Ревизия на момент подключения устарела - клиент перечитает доску целиком
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                data = json.dumps(event, ensure_ascii=False)
+                yield f"id: {event['revision']}\nevent: {event['type']}\ndata: {data}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 
 @bp.route('/api/task/<int:id>', methods=['GET'])
 @login_required
+@read_replica()
 def get_task_2(id):
-    task = Task.query.get_or_404(id)
+    version = task_version(id)
 
     # Проверка прав доступа
-    if not any(p.id == task.project_id for p in current_user.projects):
+    if not is_project_member(version.project_id):
         abort(403)
 
-    return jsonify({
+    etag = task_etag('task', id, version)
+    if is_not_modified(etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+
+    task = tasks_with_people().filter(Task.id == id).first_or_404()
+
+    return with_validators(jsonify({
         'id': task.id,
         'title': task.title,
         'description': task.description,
@@ -382,7 +738,7 @@ def get_task_2(id):
         } if task.project else None,
         'executors': [{'id': e.id, 'name': e.name} for e in task.executors],
         'created_at': task.created_at.isoformat() if task.created_at else None
-    })
+    }), etag, version.updated_at)
 
 
 @bp.route('/api/task/<int:id>', methods=['PUT'])
@@ -391,7 +747,7 @@ def update_task_2(id):
     task = Task.query.get_or_404(id)
 
     # Проверка прав доступа
-    if not any(p.id == task.project_id for p in current_user.projects):
+    if not is_project_member(task.project_id):
         abort(403)
 
     data = request.get_json()
@@ -410,8 +766,12 @@ def update_task_2(id):
     new_status = data.get('status')
     if new_status and new_status != task.status:
         task.status = new_status
+        enqueue_notification('task_status', task.id, current_user.id, status=new_status)
 
+    revision = bump_board_revision(task.project_id)
     db.session.commit()
+    publish_board_event(task.project_id, 'task_updated', revision,
+                        task_id=task.id, status=status_key(task.status), html=render_task_card(task))
 
     return jsonify({
         'id': task.id,
@@ -428,18 +788,15 @@ def update_task_2(id):
 def delete_task(id):
     task = Task.query.get_or_404(id)
 
-    # Проверяем, является ли текущий пользователь менеджером проекта
-    project_user = ProjectUser.query.filter_by(
-        project_id=task.project_id,
-        user_id=current_user.id
-    ).first()
-
     # Если пользователь не менеджер проекта - запрещаем доступ
-    if not project_user or project_user.role != 'manager':
+    if project_role(task.project_id) != 'manager':
         abort(403, description="Только менеджер проекта может удалять задачи")
 
+    project_id = task.project_id
     db.session.delete(task)
+    revision = bump_board_revision(project_id)
     db.session.commit()
+    publish_board_event(project_id, 'task_deleted', revision, task_id=id)
 
     return jsonify({'success': True})
 
@@ -450,7 +807,7 @@ def update_task_status(id):
     task = Task.query.get_or_404(id)
 
     # Проверка прав доступа
-    if not any(p.id == task.project_id for p in current_user.projects):
+    if not is_project_member(task.project_id):
         abort(403)
 
     data = request.get_json()
@@ -459,17 +816,82 @@ def update_task_status(id):
     if new_status not in ['To Do', 'In Progress', 'Done']:
         return jsonify({'error': 'Недопустимый статус'}), 400
 
+    if task.status != new_status:
+        enqueue_notification('task_status', task.id, current_user.id, status=new_status)
     task.status = new_status
+    revision = bump_board_revision(task.project_id)
+    db.session.commit()
+    publish_board_event(task.project_id, 'task_status', revision, task_id=task.id, status=status_key(new_status))
+
+    return jsonify({'success': True, 'new_status': new_status, 'revision': revision})
+
+
+BOARD_MAX_MOVES = 500
+
+
+@bp.route('/api/project/<int:project_id>/board/moves', methods=['POST'])
+@login_required
+def move_board_tasks(project_id):
+    if not is_project_member(project_id):
+        return jsonify({'error': 'Доступ запрещён'}), 403
+
+    data = request.get_json(silent=True) or {}
+    moves = data.get('moves')
+    if not isinstance(moves, list) or not moves:
+        return jsonify({'error': 'Передайте список перемещений'}), 400
+    if len(moves) > BOARD_MAX_MOVES:
+        return jsonify({'error': f'Не более {BOARD_MAX_MOVES} перемещений за запрос'}), 400
+
+    # Проверяем формат; при повторе задачи побеждает последнее перемещение
+    updates = {}
+    for move in moves:
+        if not isinstance(move, dict):
+            return jsonify({'error': 'Некорректное перемещение'}), 400
+        task_id = move.get('task_id')
+        status = TASK_STATUSES.get(move.get('status'), move.get('status'))
+        position = move.get('position')
+        if not isinstance(task_id, int) or status not in TASK_STATUSES.values():
+            return jsonify({'error': 'Некорректное перемещение'}), 400
+        if position is not None and (not isinstance(position, int) or position < 0):
+            return jsonify({'error': 'Некорректная позиция'}), 400
+        updates[task_id] = {'id': task_id, 'status': status, 'position': position}
+
+    # Все задачи должны принадлежать этому проекту: одна проверка на весь пакет
+    found = {row.id: row.status for row in db.session.query(Task.id, Task.status).filter(
+        Task.id.in_(updates),
+        Task.project_id == project_id
+    )}
+    missing = sorted(set(updates) - found.keys())
+    if missing:
+        return jsonify({'error': 'Задачи не найдены в проекте', 'task_ids': missing}), 404
+
+    db.session.execute(db.update(Task), list(updates.values()))
+    touch_tasks(updates)
+    # Массовое обновление идет мимо событий ORM, поэтому в историю пишем явно
+    for move in updates.values():
+        if move['status'] != found[move['id']]:
+            record_task_changes(move['id'], {'status': (found[move['id']], move['status'])})
+    enqueue_notifications([
+        {'type': 'task_status', 'task_id': move['id'], 'actor_id': current_user.id, 'payload': {'status': move['status']}}
+        for move in updates.values() if move['status'] != found[move['id']]
+    ])
+    revision = bump_board_revision(project_id)
     db.session.commit()
+    publish_board_event(project_id, 'tasks_moved', revision, moves=[
+        {'task_id': move['id'], 'status': status_key(move['status']), 'position': move['position']}
+        for move in updates.values()
+    ])
 
-    return jsonify({'success': True, 'new_status': new_status})
+    return jsonify({'success': True, 'updated': len(updates), 'revision': revision})
 
 
 @bp.route('/task/<int:id>')
 @login_required
 def task_details(id):
-    # Получаем задачу по ID
-    task = Task.query.get_or_404(id)
+    # Получаем задачу по ID вместе с участниками проекта
+    task = tasks_with_people().options(
+        db.joinedload(Task.project).selectinload(Project.user_associations)
+    ).filter(Task.id == id).first_or_404()
 
     # Проверяем, что текущий пользователь имеет доступ к задаче
     # (является исполнителем, менеджером или участником проекта)
@@ -491,7 +913,7 @@ def task_details(id):
         days_remaining = delta.days
 
     # Получаем информацию о менеджере
-    manager = User.query.get(task.manager_id) if task.manager_id else None
+    manager = task.manager
 
     # Получаем список исполнителей
     executors = task.executors
@@ -510,30 +932,122 @@ def task_details(id):
 
 # Добавим эти endpoint'ы в routes.py
 
+COMMENTS_PAGE_SIZE = 50
+COMMENTS_MAX_PAGE_SIZE = 200
+
+
+def decode_comment_cursor(cursor):
+    """Курсор комментария -> id или None, если он некорректен."""
+    values = decode_cursor(cursor, 1)
+    if values is None or not isinstance(values[0], int) or isinstance(values[0], bool):
+        return None
+    return values[0]
+
+
 @bp.route('/api/task/<int:task_id>/comments', methods=['GET'])
 @login_required
 def get_task_comments(task_id):
-    task = Task.query.get_or_404(task_id)
+    version = task_version(task_id)
 
     # Проверка прав доступа
-    if not any(p.id == task.project_id for p in current_user.projects):
+    if not is_project_member(version.project_id):
         abort(403)
 
-    # Получаем комментарии для задачи
-    comments = []
-    for comment in task.comments:
-        comments.append({
-            'id': comment.id,
-            'content': comment.content,
-            'timestamp': comment.timestamp.strftime('%d.%m.%Y %H:%M'),
-            'author': {
-                'id': comment.author.id,
-                'name': comment.author.name,
-                'email': comment.author.email
-            }
-        })
+    etag = task_etag('comments', task_id, version)
+    if is_not_modified(etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+
+    # Keyset-пагинация по id (порядок добавления; время комментария задает часовой пояс
+    # сервера и может идти не по порядку): по умолчанию последняя страница,
+    # before - более ранние комментарии, since - только новые после курсора
+    before = request.args.get('before')
+    since = request.args.get('since')
+    if before and since:
+        return jsonify({'error': 'Нельзя указывать before и since одновременно'}), 400
+
+    cursor = None
+    if before or since:
+        cursor = decode_comment_cursor(before or since)
+        if cursor is None:
+            return jsonify({'error': 'Некорректный курсор'}), 400
+
+    limit = page_limit(COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE)
+
+    if since:
+        page = comments_with_authors(task_id).filter(Comment.id > cursor).limit(limit + 1).all()
+        has_more = len(page) > limit
+        page = page[:limit]
+    else:
+        query = comments_with_authors(task_id, newest_first=True)
+        if before:
+            query = query.filter(Comment.id < cursor)
+        page = query.limit(limit + 1).all()
+        has_more = len(page) > limit
+        page = page[:limit][::-1]
+
+    comments = [{
+        'id': comment.id,
+        'content': comment.content,
+        'timestamp': comment.timestamp.strftime('%d.%m.%Y %H:%M'),
+        'author': {
+            'id': comment.author.id,
+            'name': comment.author.name,
+            'email': comment.author.email
+        }
+    } for comment in page]
+
+    # next_cursor - последний отданный комментарий, с него продолжается опрос since;
+    # при пустом ответе курсор остается прежним
+    next_cursor = encode_cursor(page[-1].id) if page else since
+    prev_cursor = encode_cursor(page[0].id) if has_more and not since else None
+
+    return with_validators(jsonify({
+        'comments': comments,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'has_more': has_more
+    }), etag, version.updated_at)
+
 
-    return jsonify({'comments': comments})
+HISTORY_PAGE_SIZE = 30
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+@bp.route('/api/task/<int:task_id>/history')
+@login_required
+def get_task_history(task_id):
+    version = task_version(task_id)
+
+    # Проверка прав доступа
+    if not is_project_member(version.project_id):
+        abort(403)
+
+    # Keyset-пагинация по id: новые записи сверху, before - курсор последней строки
+    query = history_with_users(task_id)
+    before = request.args.get('before')
+    if before:
+        cursor = decode_cursor(before, 1)
+        if cursor is None or not isinstance(cursor[0], int):
+            return jsonify({'error': 'Некорректный курсор'}), 400
+        query = query.filter(ChangeHistory.id < cursor[0])
+
+    limit = page_limit(HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+    page = query.limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    history = [{
+        'id': entry.id,
+        'timestamp': entry.timestamp.strftime('%d.%m.%Y %H:%M') if entry.timestamp else None,
+        'user': {'id': entry.user.id, 'name': entry.user.name} if entry.user else None,
+        'changes': json.loads(entry.changes)
+    } for entry in page]
+
+    return jsonify({
+        'history': history,
+        'next_cursor': encode_cursor(page[-1].id) if has_more else None,
+        'has_more': has_more
+    })
 
 
 @bp.route('/api/task/<int:task_id>/comments', methods=['POST'])
@@ -542,7 +1056,7 @@ def add_task_comment(task_id):
     task = Task.query.get_or_404(task_id)
 
     # Проверка прав доступа
-    if not any(p.id == task.project_id for p in current_user.projects):
+    if not is_project_member(task.project_id):
         abort(403)
 
     data = request.get_json()
@@ -559,6 +1073,8 @@ def add_task_comment(task_id):
     )
 
     db.session.add(new_comment)
+    touch_tasks([task_id])
+    enqueue_notification('task_comment', task_id, current_user.id)
     db.session.commit()
 
     return jsonify({
@@ -573,6 +1089,78 @@ def add_task_comment(task_id):
     }), 201
 
 
+
+NOTIFICATIONS_PAGE_SIZE = 30
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+
+
+def notifications_page(user_id, before=None, limit=NOTIFICATIONS_PAGE_SIZE):
+    """Страница ленты уведомлений (новые сверху) и курсор следующей страницы."""
+    query = Notification.query.filter(Notification.recipient_id == user_id)
+    if before is not None:
+        query = query.filter(Notification.id < before)
+    page = query.order_by(Notification.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1].id)
+    return page, next_cursor
+
+
+@bp.route('/notifications')
+@login_required
+def notifications():
+    page, next_cursor = notifications_page(current_user.id)
+    return render_template('notifications.html', notifications=page, next_cursor=next_cursor)
+
+
+@bp.route('/api/notifications')
+@login_required
+def list_notifications():
+    before = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        values = decode_cursor(cursor, 1)
+        if values is None or not isinstance(values[0], int):
+            return jsonify({'error': 'Некорректный курсор'}), 400
+        before = values[0]
+
+    limit = page_limit(NOTIFICATIONS_PAGE_SIZE, NOTIFICATIONS_MAX_PAGE_SIZE)
+    page, next_cursor = notifications_page(current_user.id, before, limit)
+
+    return jsonify({
+        'notifications': [{
+            'id': notification.id,
+            'type': notification.type,
+            'message': notification.message,
+            'timestamp': notification.timestamp.strftime('%d.%m.%Y %H:%M') if notification.timestamp else None,
+            'is_read': bool(notification.is_read)
+        } for notification in page],
+        'next_cursor': next_cursor
+    })
+
+
+@bp.route('/api/notifications/unread-count')
+@login_required
+def notifications_unread_count():
+    # Счетчик хранится отдельно: значок на каждой странице не считает строки notification
+    return jsonify({'unread': unread_count(current_user.id)})
+
+
+@bp.route('/api/notifications/read-all', methods=['POST'])
+@login_required
+def read_all_notifications():
+    updated = mark_read(current_user.id)
+    return jsonify({'success': True, 'updated': updated, 'unread': 0})
+
+
+@bp.route('/api/notifications/<int:notification_id>/read', methods=['POST'])
+@login_required
+def read_notification(notification_id):
+    mark_read(current_user.id, [notification_id])
+    return jsonify({'success': True, 'unread': unread_count(current_user.id)})
+
 @bp.route('/admin')
 @login_required
 def admin_panel():
@@ -587,84 +1175,114 @@ def create_backup():
     if not current_user.is_admin:
         abort(403)
 
-    data = request.get_json()
-    backup_dir = data.get('path')
-    backup_name = data.get('name')
+    data = request.get_json() or {}
+    backup_dir = (data.get('path') or '').strip() or None
+    backup_name = secure_filename(data.get('name') or '')
 
-    if not backup_dir or not backup_name:
-        return jsonify({'error': 'Не указаны путь или имя резервной копии'}), 400
+    if not backup_name:
+        return jsonify({'error': 'Не указано имя резервной копии'}), 400
 
-    try:
-        # Нормализуем путь для Windows
+    if backup_dir:
         backup_dir = os.path.normpath(backup_dir)
-
-        # Создаем папку для резервных копий, если её нет
-        Path(backup_dir).mkdir(parents=True, exist_ok=True)
-        test_file = os.path.join(backup_dir, '.write_test')
         try:
-            with open(test_file, 'w') as f:
-                f.write("test")
-            os.remove(test_file)
-        except PermissionError:
-            return "Нет прав на запись в указанную папку", 403
-
-        # Формируем имя файла с датой
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"{backup_name}_{timestamp}.sql"
-        backup_path = os.path.join(backup_dir, backup_filename)
-
-        # Получаем параметры подключения из конфига Flask
-        db_uri = current_app.config['SQLALCHEMY_DATABASE_URI']
-
-        # Парсим параметры подключения
-        from urllib.parse import urlparse
-        parsed = urlparse(db_uri)
-
-        db_name = parsed.path[1:]  # убираем первый слэш
-        db_user = parsed.username
-        db_password = parsed.password
-        db_host = parsed.hostname
-        db_port = parsed.port or 5432  # стандартный порт PostgreSQL
-
-        # Формируем команду pg_dump
-        pg_dump_cmd = [
-            r"C:\Program Files\PostgreSQL\16\bin\pg_dump.exe",
-            '-h', db_host,
-            '-p', str(db_port),
-            '-U', db_user,
-            '-d', db_name,
-            '-f', backup_path
-        ]
-
-        # Устанавливаем переменную окружения с паролем
-        env = os.environ.copy()
-        env['PGPASSWORD'] = db_password
-
-        # Выполняем команду
-        subprocess.run(pg_dump_cmd, env=env, check=True)
-
-        # Логируем действие
-        report = Report(
-            timestamp=datetime.now(),
-            backup_path=backup_path,
-            description=f"Резервная копия создана администратором {current_user.name}"
-        )
-        db.session.add(report)
-        db.session.commit()
+            os.makedirs(backup_dir, exist_ok=True)
+        except OSError as e:
+            return jsonify({'error': f'Не удалось создать папку: {e}'}), 400
+        if not os.access(backup_dir, os.W_OK):
+            return jsonify({'error': 'Нет прав на запись в указанную папку'}), 403
+
+    # Копию выполняет очередь фоновых задач (app/jobs.py), прогресс - в report.progress
+    report = Report(
+        report_type='backup',
+        format='ndjson',
+        parameters={'name': backup_name, 'path': backup_dir},
+        generator_id=current_user.id,
+        status='pending',
+        progress=0
+    )
+    db.session.add(report)
+    db.session.commit()
+    wake_report_workers()
 
-        return jsonify({
-            'success': True,
-            'file_path': backup_path
-        })
+    return jsonify({
+        'success': True,
+        'report_id': report.id
+    })
 
-    except subprocess.CalledProcessError as e:
-        return jsonify({
-            'error': f'Ошибка при создании SQL-дампа: {str(e)}'
-        }), 500
-    except Exception as e:
-        return jsonify({
-            'error': f'Ошибка при создании резервной копии: {str(e)}'
-        }), 500
+
+@bp.route('/admin/backups')
+@login_required
+def list_backups():
+    if not current_user.is_admin:
+        abort(403)
+
+    from app.backup import list_backups as backup_list
+
+    return jsonify({'backups': backup_list()})
+
+
+@bp.route('/admin/restore_backup', methods=['POST'])
+@login_required
+def restore_backup():
+    if not current_user.is_admin:
+        abort(403)
+
+    data = request.get_json() or {}
+    backup_dir = (data.get('path') or '').strip()
+    if not backup_dir:
+        return jsonify({'error': 'Не указана резервная копия'}), 400
+
+    # Модуль резервных копий загружается только для административных операций
+    from app.backup import BackupError, read_manifest
+
+    backup_dir = os.path.normpath(backup_dir)
+    try:
+        read_manifest(backup_dir)
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Восстановление тоже выполняет очередь фоновых задач
+    report = Report(
+        report_type='restore',
+        format='ndjson',
+        parameters={'path': backup_dir},
+        generator_id=current_user.id,
+        status='pending'
+    )
+    db.session.add(report)
+    db.session.commit()
+    wake_report_workers()
+
+    return jsonify({
+        'success': True,
+        'report_id': report.id
+    })
+
+
+@bp.route('/admin/backups/<int:report_id>')
+@login_required
+def backup_status(report_id):
+    if not current_user.is_admin:
+        abort(403)
+
+    report = Report.query.filter(
+        Report.id == report_id, Report.report_type.in_(('backup', 'restore'))
+    ).first_or_404()
+    return jsonify({
+        'status': report.status,
+        'progress': report.progress,
+        'file_path': report.file_path,
+        'error': report.error_message
+    })
+
+
+@bp.route('/admin/pool-stats')
+@login_required
+def admin_pool_stats():
+    if not current_user.is_admin:
+        abort(403)
+    # Статистика пула этого процесса веб-сервера
+    return jsonify(pool_stats(current_app))
 
 
 @bp.route('/admin/reports')
@@ -673,7 +1291,7 @@ def reports_dashboard():
     if not current_user.is_admin:
         abort(403)
 
-    reports = Report.query.order_by(Report.timestamp.desc()).limit(50).all()
+    reports = reports_with_generator().order_by(Report.timestamp.desc()).limit(50).all()
     return render_template('reports_dashboard.html', reports=reports)
 
 
@@ -691,6 +1309,13 @@ def generate_report():
     if not report_type:
         return jsonify({'error': 'Не указан тип отчета'}), 400
 
+    # Резервные копии ставятся в очередь своими маршрутами
+    if report_type not in REPORT_TYPES:
+        return jsonify({'error': 'Неизвестный тип отчета'}), 400
+
+    if format_type not in REPORT_FORMATS:
+        return jsonify({'error': 'Неизвестный формат отчета'}), 400
+
     try:
         # Создаем запись о отчете
         report = Report(
@@ -703,8 +1328,8 @@ def generate_report():
         db.session.add(report)
         db.session.commit()
 
-        # Запускаем генерацию отчета в фоне
-        generate_report_background(report.id)
+        # Отчет выполнит фоновый воркер, ответ возвращаем сразу
+        wake_report_workers()
 
         return jsonify({
             'success': True,
@@ -717,350 +1342,6 @@ def generate_report():
         }), 500
 
 
-def generate_report_background(report_id):
-    from app import create_app
-    app = create_app()
-
-    with app.app_context():
-        report = Report.query.get(report_id)
-        if not report:
-            return
-
-        try:
-            # Создаем директорию для отчетов, если ее нет
-            reports_dir = os.path.join(app.instance_path, 'reports')
-            os.makedirs(reports_dir, exist_ok=True)
-
-            filename = f"{report.report_type}_{report.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-            if report.report_type == 'tasks':
-                # Генерация отчета по задачам
-                tasks = Task.query.all()
-                report_data = [{
-                    'id': t.id,
-                    'title': t.title,
-                    'status': t.status,
-                    'project': t.project.name if t.project else None,
-                    'created_at': t.created_at.strftime('%d.%m.%Y %H:%M') if t.created_at else None,
-                    'deadline': t.deadline.strftime('%d.%m.%Y') if t.deadline else None,
-                    'manager': t.manager.name if t.manager else None,
-                    'executors': ', '.join([e.name for e in t.executors])
-                } for t in tasks]
-
-                if report.format == 'pdf':
-                    file_path = os.path.join(reports_dir, f"{filename}.pdf")
-                    generate_pdf_report(
-                        title=f"Отчет по задачам",
-                        data=report_data,
-                        filename=file_path,
-                        columns=[
-                            ('ID', 'id', 10),
-                            ('Название', 'title', 50),
-                            ('Статус', 'status', 20),
-                            ('Проект', 'project', 30),
-                            ('Дата создания', 'created_at', 25),
-                            ('Дедлайн', 'deadline', 20),
-                            ('Менеджер', 'manager', 30),
-                            ('Исполнители', 'executors', 40)
-                        ]
-                    )
-                else:
-                    file_path = os.path.join(reports_dir, f"{filename}.json")
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        json.dump(report_data, f, ensure_ascii=False, indent=2)
-
-            elif report.report_type == 'projects':
-                # Генерация отчета по проектам
-                projects = Project.query.all()
-                report_data = []
-                for p in projects:
-                    project_data = {
-                        'id': p.id,
-                        'name': p.name,
-                        'description': p.description,
-                        'created_at': p.created_at.strftime('%d.%m.%Y %H:%M') if p.created_at else None,
-                        'deadline': p.deadline.strftime('%d.%m.%Y') if p.deadline else None,
-                        'total_tasks': len(p.tasks),
-                        'tasks_by_status': {
-                            'todo': len([t for t in p.tasks if t.status == 'To Do']),
-                            'in_progress': len([t for t in p.tasks if t.status == 'In Progress']),
-                            'done': len([t for t in p.tasks if t.status == 'Done'])
-                        },
-                        'participants': ', '.join(
-                            [f"{u.name} ({pu.role})" for u, pu in zip(p.users, p.user_associations)])
-                    }
-                    report_data.append(project_data)
-
-                if report.format == 'pdf':
-                    file_path = os.path.join(reports_dir, f"{filename}.pdf")
-                    generate_pdf_report(
-                        title=f"Отчет по проектам",
-                        data=report_data,
-                        filename=file_path,
-                        columns=[
-                            ('ID', 'id', 10),
-                            ('Название', 'name', 40),
-                            ('Описание', 'description', 60),
-                            ('Дата создания', 'created_at', 25),
-                            ('Дедлайн', 'deadline', 20),
-                            ('Всего задач', 'total_tasks', 20),
-                            ('Участники', 'participants', 60)
-                        ],
-                        charts=[
-                            {
-                                'type': 'pie',
-                                'data': {
-                                    'labels': ['To Do', 'In Progress', 'Done'],
-                                    'values': [
-                                        sum(p['tasks_by_status']['todo'] for p in report_data),
-                                        sum(p['tasks_by_status']['in_progress'] for p in report_data),
-                                        sum(p['tasks_by_status']['done'] for p in report_data)
-                                    ],
-                                    'title': 'Распределение задач по статусам'
-                                }
-                            }
-                        ]
-                    )
-                else:
-                    file_path = os.path.join(reports_dir, f"{filename}.json")
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        json.dump(report_data, f, ensure_ascii=False, indent=2)
-
-            elif report.report_type == 'users':
-                # Генерация отчета по пользователям
-                users = User.query.all()
-                report_data = []
-                for u in users:
-                    user_data = {
-                        'id': u.id,
-                        'name': u.name,
-                        'email': u.email,
-                        'total_projects': len(u.projects),
-                        'total_tasks_assigned': len(u.assigned_tasks),
-                        'tasks_by_status': {
-                            'todo': len([t for t in u.assigned_tasks if t.status == 'To Do']),
-                            'in_progress': len([t for t in u.assigned_tasks if t.status == 'In Progress']),
-                            'done': len([t for t in u.assigned_tasks if t.status == 'Done'])
-                        }
-                    }
-                    report_data.append(user_data)
-
-                if report.format == 'pdf':
-                    file_path = os.path.join(reports_dir, f"{filename}.pdf")
-                    generate_pdf_report(
-                        title=f"Отчет по пользователям",
-                        data=report_data,
-                        filename=file_path,
-                        columns=[
-                            ('ID', 'id', 10),
-                            ('Имя', 'name', 30),
-                            ('Email', 'email', 50),
-                            ('Дата регистрации', 'registration_date', 25),
-                            ('Последний вход', 'last_login', 25),
-                            ('Проектов', 'total_projects', 20),
-                            ('Задач', 'total_tasks_assigned', 20)
-                        ],
-                        charts=[
-                            {
-                                'type': 'bar',
-                                'data': {
-                                    'labels': [u['name'] for u in report_data],
-                                    'values': [u['total_tasks_assigned'] for u in report_data],
-                                    'title': 'Количество задач на пользователя'
-                                }
-                            }
-                        ]
-                    )
-                else:
-                    file_path = os.path.join(reports_dir, f"{filename}.json")
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        json.dump(report_data, f, ensure_ascii=False, indent=2)
-
-            # Обновляем отчет
-            report.file_path = file_path
-            report.status = 'completed'
-            report.completed_at = datetime.now()
-            db.session.commit()
-
-        except Exception as e:
-            report.status = 'failed'
-            report.error_message = str(e)
-            db.session.commit()
-            app.logger.error(f"Failed to generate report {report.id}: {str(e)}")
-
-
-def generate_pdf_report(title, data, filename, columns, charts=None):
-    import matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    from fpdf.enums import XPos, YPos
-    import tempfile
-    import os
-    import numpy as np
-
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=25)
-
-    # Добавляем шрифты с проверкой
-    fonts_dir = os.path.join(os.path.dirname(__file__), 'fonts')
-    try:
-        pdf.add_font('DejaVu', '', os.path.join(fonts_dir, 'DejaVuSansCondensed.ttf'), uni=True)
-        pdf.add_font('DejaVu', 'B', os.path.join(fonts_dir, 'DejaVuSansCondensed-Bold.ttf'), uni=True)
-    except Exception as e:
-        print(f"Font loading error: {e}")
-        return
-
-    # Заголовок
-    pdf.set_font('DejaVu', 'B', 16)
-    pdf.cell(0, 10, title, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-    pdf.ln(10)
-
-    # Дата генерации
-    pdf.set_font('DejaVu', '', 10)
-    pdf.cell(0, 5, f"Сгенерировано: {datetime.now().strftime('%d.%m.%Y %H:%M')}",
-             new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
-    pdf.ln(10)
-
-    # Расчет ширины столбцов
-    col_widths = []
-    pdf.set_font('DejaVu', 'B', 12)
-    for col in columns:
-        max_width = pdf.get_string_width(col[0]) + 8  # Минимальная ширина заголовка
-
-        # Проверяем все данные
-        for row in data:
-            value = str(row.get(col[1], ''))
-            lines = value.split('\n')
-            for line in lines:
-                cell_width = pdf.get_string_width(line) + 8
-                if cell_width > max_width:
-                    max_width = cell_width
-
-        col_widths.append(max_width)
-
-    # Автоматическое масштабирование
-    total_width = sum(col_widths)
-    if total_width > pdf.epw:
-        scale_factor = pdf.epw / total_width * 0.95  # Небольшой запас
-        col_widths = [w * scale_factor for w in col_widths]
-
-    # Заголовки таблицы
-    pdf.set_fill_color(220, 220, 220)
-    pdf.set_font('DejaVu', 'B', 12)
-    for i, col in enumerate(columns):
-        pdf.cell(col_widths[i], 10, col[0], border=1, align='C', fill=True)
-    pdf.ln()
-
-    # Данные таблицы
-    pdf.set_font('DejaVu', '', 10)
-    fill = False
-
-    for row in data:
-        # Определяем высоту строки
-        line_heights = []
-        for i, col in enumerate(columns):
-            value = str(row.get(col[1], ''))
-            lines = pdf.multi_cell(col_widths[i], 5, value, border=0, align='L',
-                                   split_only=True)
-            line_heights.append(len(lines))
-
-        row_height = max(line_heights) * 6  # Высота строки с учетом всех ячеек
-
-        # Проверка на выход за границы страницы
-        if pdf.get_y() + row_height > pdf.page_break_trigger:
-            pdf.add_page()
-            # Повторяем заголовки
-            pdf.set_font('DejaVu', 'B', 12)
-            for i, col in enumerate(columns):
-                pdf.cell(col_widths[i], 10, col[0], border=1, align='C', fill=True)
-            pdf.ln()
-            pdf.set_font('DejaVu', '', 10)
-
-        # Рисуем строку
-        y_start = pdf.get_y()
-        pdf.set_fill_color(245 if fill else 255)
-        for i, col in enumerate(columns):
-            value = str(row.get(col[1], ''))
-            x = pdf.get_x()
-            y = y_start
-
-            # Ячейка с фоном
-            pdf.set_xy(x, y)
-            pdf.cell(col_widths[i], row_height, '', border=1, fill=fill)
-
-            # Текст в ячейке
-            pdf.set_xy(x + 2, y + 2)
-            pdf.multi_cell(col_widths[i] - 4, 5, value, border=0, align='L')
-
-            pdf.set_x(x + col_widths[i])
-
-        pdf.set_y(y_start + row_height)
-        fill = not fill  # Чередуем цвет фона
-
-    # Графики
-    if charts:
-        pdf.add_page()
-        pdf.set_font('DejaVu', 'B', 14)
-        pdf.cell(0, 10, "Визуализация данных", 0, 1, 'C')
-        pdf.ln(10)
-
-        for chart in charts:
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmpfile:
-                try:
-                    plt.figure(figsize=(8, 5), dpi=100)  # Уменьшаем размер и DPI для лучшего качества
-
-                    if chart['type'] == 'pie':
-                        plt.pie(
-                            chart['data']['values'],
-                            labels=chart['data']['labels'],
-                            autopct='%1.1f%%',
-                            startangle=90,
-                            textprops={'fontsize': 8}  # Уменьшаем размер шрифта
-                        )
-                        plt.title(chart['data']['title'], fontsize=10)
-                        plt.tight_layout()
-
-                    elif chart['type'] == 'bar':
-                        sns.set(font_scale=0.8)  # Уменьшаем размер шрифта
-                        barplot = sns.barplot(
-                            x=chart['data']['labels'],
-                            y=chart['data']['values']
-                        )
-                        plt.title(chart['data']['title'], fontsize=10)
-                        plt.xticks(rotation=45, ha='right', fontsize=8)
-                        plt.yticks(fontsize=8)
-
-                        # Добавляем значения на столбцы
-                        for p in barplot.patches:
-                            barplot.annotate(
-                                format(p.get_height(), '.1f'),
-                                (p.get_x() + p.get_width() / 2., p.get_height()),
-                                ha='center', va='center',
-                                xytext=(0, 5),
-                                textcoords='offset points',
-                                fontsize=8
-                            )
-
-                        plt.tight_layout()
-
-                    plt.savefig(tmpfile.name, bbox_inches='tight', dpi=150)  # Уменьшаем DPI
-                    plt.close()
-
-                    # Добавляем график в PDF
-                    pdf.set_font('DejaVu', '', 12)
-                    pdf.cell(0, 10, chart['data']['title'], 0, 1, 'C')
-                    pdf.image(tmpfile.name, x=10, y=None, w=180)
-                    pdf.ln(10)
-
-                finally:
-                    try:
-                        os.unlink(tmpfile.name)
-                    except:
-                        pass
-
-    pdf.output(filename)
 @bp.route('/admin/download_report/<int:report_id>')
 @login_required
 def download_report(report_id):
@@ -1072,7 +1353,7 @@ def download_report(report_id):
         abort(404)
 
     # Определяем MIME-тип в зависимости от формата отчета
-    mimetype = 'application/pdf' if report.format == 'pdf' else 'application/json'
+    mimetype = REPORT_FORMATS.get(report.format, REPORT_FORMATS['json'])[1]
 
     return send_from_directory(
         directory=os.path.dirname(report.file_path),
@@ -0,0 +1,112 @@
+# app/search.py
+import re
+
+from app.models import db, Task, Comment, ProjectUser
+
+# Конфигурация текстового поиска PostgreSQL (должна совпадать с миграцией)
+PG_SEARCH_CONFIG = 'russian'
+# Совпадение в комментарии весит меньше совпадения в самой задаче
+COMMENT_RANK_WEIGHT = 0.5
+SEARCH_MAX_TERMS = 8
+
+# Слова запроса: буквы и цифры, все остальное - разделители. Так строку
+# пользователя нельзя превратить в синтаксис tsquery или FTS5.
+SEARCH_TERM_RE = re.compile(r'[^\W_]+')
+
+
+def search_terms(text):
+    # ё -> е так же, как при индексации в SQLite (см. миграцию поиска)
+    return SEARCH_TERM_RE.findall(text.lower().replace('ё', 'е'))[:SEARCH_MAX_TERMS]
+
+
+def _pg_matches(terms):
+    # Каждое слово ищется по префиксу, слова объединяются через И
+    query = db.func.to_tsquery(PG_SEARCH_CONFIG, ' & '.join(f'{term}:*' for term in terms))
+    task_vector = db.literal_column('task.search_vector')
+    comment_vector = db.literal_column('comment.search_vector')
+
+    task_matches = db.select(
+        Task.id.label('task_id'),
+        db.cast(db.func.ts_rank(task_vector, query), db.Float).label('rank')
+    ).where(task_vector.op('@@')(query))
+
+    comment_matches = db.select(
+        Comment.task_id.label('task_id'),
+        db.cast(db.func.ts_rank(comment_vector, query) * COMMENT_RANK_WEIGHT, db.Float).label('rank')
+    ).join(Task, Task.id == Comment.task_id).where(comment_vector.op('@@')(query))
+
+    return task_matches, comment_matches
+
+
+def _sqlite_matches(terms):
+    # bm25 тем меньше, чем лучше совпадение, поэтому знак меняется
+    query = ' '.join(f'"{term}"*' for term in terms)
+    task_fts = db.table('task_fts', db.column('rowid'))
+    comment_fts = db.table('comment_fts', db.column('rowid'))
+
+    task_matches = db.select(
+        Task.id.label('task_id'),
+        (-db.func.bm25(db.literal_column('task_fts'), 2.0, 1.0)).label('rank')
+    ).select_from(task_fts).join(Task, Task.id == task_fts.c.rowid).where(
+        db.literal_column('task_fts').op('MATCH')(query)
+    )
+
+    comment_matches = db.select(
+        Comment.task_id.label('task_id'),
+        (-db.func.bm25(db.literal_column('comment_fts')) * COMMENT_RANK_WEIGHT).label('rank')
+    ).select_from(comment_fts).join(Comment, Comment.id == comment_fts.c.rowid).join(
+        Task, Task.id == Comment.task_id
+    ).where(db.literal_column('comment_fts').op('MATCH')(query))
+
+    return task_matches, comment_matches
+
+
+def _like_matches(terms):
+    # Запасной вариант для остальных баз: подстрока без индекса, ранг - только
+    # задача или комментарий. Слова запроса не содержат % и _, экранировать нечего
+    def contains_all(*columns):
+        return db.and_(*(db.or_(*(column.ilike(f'%{term}%') for column in columns)) for term in terms))
+
+    task_matches = db.select(
+        Task.id.label('task_id'),
+        db.literal(1.0, db.Float).label('rank')
+    ).where(contains_all(Task.title, Task.description))
+
+    comment_matches = db.select(
+        Comment.task_id.label('task_id'),
+        db.literal(COMMENT_RANK_WEIGHT, db.Float).label('rank')
+    ).join(Task, Task.id == Comment.task_id).where(contains_all(Comment.content))
+
+    return task_matches, comment_matches
+
+
+def search_tasks(user_id, terms, project_id=None, after=None, limit=20):
+    """Ищет задачи по названию, описанию и комментариям.
+
+    Возвращает список (task_id, rank) по убыванию релевантности, не длиннее
+    limit + 1 (лишняя строка означает, что есть следующая страница). Поиск
+    ограничен проектами пользователя. after - (rank, task_id) последней
+    строки предыдущей страницы. Индексы есть для PostgreSQL и SQLite, на
+    других базах поиск идет через ILIKE.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        task_matches, comment_matches = _pg_matches(terms)
+    elif dialect == 'sqlite':
+        task_matches, comment_matches = _sqlite_matches(terms)
+    else:
+        task_matches, comment_matches = _like_matches(terms)
+
+    scope = [Task.project_id.in_(db.select(ProjectUser.project_id).where(ProjectUser.user_id == user_id))]
+    if project_id is not None:
+        scope.append(Task.project_id == project_id)
+
+    matches = db.union_all(task_matches.where(*scope), comment_matches.where(*scope)).subquery()
+    rank = db.func.max(matches.c.rank)
+
+    query = db.select(matches.c.task_id, rank.label('rank')).group_by(matches.c.task_id)
+    if after is not None:
+        last_rank, last_id = after
+        query = query.having(db.or_(rank < last_rank, db.and_(rank == last_rank, matches.c.task_id > last_id)))
+
+    return db.session.execute(query.order_by(rank.desc(), matches.c.task_id).limit(limit + 1)).all()
@@ -0,0 +1,29 @@
+// notifications.js
+
+// Значок непрочитанных уведомлений в шапке: счетчик читается из кэша на сервере
+const NOTIFICATIONS_POLL_INTERVAL = 60000;
+
+function renderNotificationsBadge(unread) {
+    const badge = document.getElementById('notificationsBadge');
+    if (!badge) return;
+    badge.textContent = unread > 99 ? '99+' : unread;
+    badge.hidden = unread === 0;
+}
+
+async function refreshNotificationsBadge() {
+    try {
+        const response = await fetch('/api/notifications/unread-count');
+        if (!response.ok) return;
+        const data = await response.json();
+        renderNotificationsBadge(data.unread);
+    } catch (error) {
+        console.error('Ошибка загрузки уведомлений:', error);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    refreshNotificationsBadge();
+    setInterval(() => {
+        if (!document.hidden) refreshNotificationsBadge();
+    }, NOTIFICATIONS_POLL_INTERVAL);
+});
@@ -0,0 +1,252 @@
+# app/task_import.py
+import csv
+import io
+import json
+import re
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy.exc import DBAPIError
+
+from app.models import db, User, Project, Task, TaskExecutor, TASK_STATUSES, bump_board_revision
+from app.notifications import enqueue_many as enqueue_notifications
+
+tasks_cli = AppGroup('tasks', help='Массовые операции с задачами.')
+
+# Сколько задач вставляется одним executemany
+IMPORT_BATCH_SIZE = 1000
+
+IMPORT_FORMATS = ('json', 'csv')
+DEADLINE_FORMATS = ('%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%d.%m.%Y')
+
+
+class ImportFormatError(ValueError):
+    """Файл импорта не удалось разобрать целиком."""
+
+
+def parse_rows(data, fmt):
+    """Разбирает JSON (список объектов или {"tasks": [...]}) или CSV с заголовком."""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+
+    if fmt == 'json':
+        try:
+            rows = json.loads(data)
+        except ValueError as e:
+            raise ImportFormatError(f'Некорректный JSON: {e}')
+        if isinstance(rows, dict):
+            rows = rows.get('tasks')
+        if not isinstance(rows, list):
+            raise ImportFormatError('Ожидается список задач')
+        return rows
+
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(data)))
+
+    raise ImportFormatError(f'Неизвестный формат: {fmt}')
+
+
+def _parse_deadline(value):
+    if value in (None, ''):
+        return None
+    for fmt in DEADLINE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt)
+        except ValueError:
+            continue
+    raise ValueError(f'Некорректная дата: {value}')
+
+
+def _parse_ids(value):
+    """Исполнители: список id или строка "1;2;3" (разделители ; , и пробел)."""
+    if value in (None, ''):
+        return []
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = [item for item in re.split(r'[;,\s]+', str(value)) if item]
+    return [int(item) for item in items]
+
+
+def _parse_status(value):
+    if value in (None, ''):
+        return 'To Do'
+    value = str(value).strip()
+    if value in TASK_STATUSES:
+        return TASK_STATUSES[value]
+    if value in TASK_STATUSES.values():
+        return value
+    raise ValueError(f'Недопустимый статус: {value}')
+
+
+def _text(value, field):
+    """Текстовое поле: строки и числа (из JSON) приводятся к строке, остальное - ошибка строки."""
+    if value is None:
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f'Некорректное значение поля {field}')
+    return str(value).strip()
+
+
+def validate_row(row):
+    """Приводит строку импорта к значениям колонок; ошибки - ValueError с текстом для отчета."""
+    if not isinstance(row, dict):
+        raise ValueError('Строка должна быть объектом')
+
+    title = _text(row.get('title'), 'title')
+    if not title:
+        raise ValueError('Не указано название')
+
+    project_id = row.get('project_id', row.get('project'))
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        raise ValueError('Не указан проект')
+
+    try:
+        executor_ids = _parse_ids(row.get('executors'))
+    except (TypeError, ValueError):
+        raise ValueError('Некорректный список исполнителей')
+
+    return {
+        'title': title,
+        'description': _text(row.get('description'), 'description') or None,
+        'deadline': _parse_deadline(row.get('deadline')),
+        'priority': _text(row.get('priority'), 'priority').capitalize() or None,
+        'status': _parse_status(row.get('status')),
+        'project_id': project_id
+    }, executor_ids
+
+
+def import_tasks(rows, manager_id, allowed_project_ids=None, batch_size=IMPORT_BATCH_SIZE):
+    """Импортирует задачи пачками.
+
+    Проекты и исполнители проверяются одним запросом IN на весь файл.
+    Строки с ошибками пропускаются и попадают в отчет с номером строки
+    (с единицы), остальные вставляются через executemany с RETURNING.
+    allowed_project_ids ограничивает проекты, в которые можно импортировать.
+    """
+    errors = []
+    valid = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            values, executor_ids = validate_row(row)
+        except ValueError as e:
+            errors.append({'row': number, 'error': str(e)})
+            continue
+        except (TypeError, AttributeError):
+            # Неожиданная структура строки не должна прерывать импорт всего файла
+            errors.append({'row': number, 'error': 'Некорректная строка'})
+            continue
+        values['manager_id'] = manager_id
+        valid.append((number, values, executor_ids))
+
+    project_ids = {values['project_id'] for _, values, _ in valid}
+    existing_projects = {row.id for row in db.session.query(Project.id).filter(Project.id.in_(project_ids))} \
+        if project_ids else set()
+    if allowed_project_ids is not None:
+        existing_projects &= set(allowed_project_ids)
+
+    user_ids = {user_id for _, _, executor_ids in valid for user_id in executor_ids}
+    existing_users = {row.id for row in db.session.query(User.id).filter(User.id.in_(user_ids))} \
+        if user_ids else set()
+
+    pending = []
+    for number, values, executor_ids in valid:
+        if values['project_id'] not in existing_projects:
+            errors.append({'row': number, 'error': 'Проект не найден или нет доступа'})
+            continue
+        unknown = [user_id for user_id in executor_ids if user_id not in existing_users]
+        if unknown:
+            errors.append({'row': number, 'error': f'Исполнители не найдены: {unknown}'})
+            continue
+        pending.append((number, values, list(dict.fromkeys(executor_ids))))
+
+    created = []
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            with db.session.begin_nested():
+                created.extend(_insert_batch(batch))
+        except DBAPIError:
+            # Пачка не прошла целиком - вставляем по одной, чтобы найти виноватые строки
+            for item in batch:
+                try:
+                    with db.session.begin_nested():
+                        created.extend(_insert_batch([item]))
+                except DBAPIError as e:
+                    errors.append({'row': item[0], 'error': str(e.orig)})
+        for project_id in {values['project_id'] for _, values, _ in batch}:
+            bump_board_revision(project_id)
+        db.session.commit()
+
+    errors.sort(key=lambda error: error['row'])
+    return {'created': len(created), 'task_ids': created, 'errors': errors}
+
+
+def _insert_batch(batch):
+    result = db.session.execute(
+        db.insert(Task).returning(Task.id, sort_by_parameter_order=True),
+        [values for _, values, _ in batch]
+    )
+    task_ids = result.scalars().all()
+
+    links = [
+        {'task_id': task_id, 'user_id': user_id}
+        for task_id, (_, _, executor_ids) in zip(task_ids, batch)
+        for user_id in executor_ids
+    ]
+    if links:
+        db.session.execute(db.insert(TaskExecutor), links)
+        enqueue_notifications([
+            {'type': 'task_assigned', 'task_id': task_id, 'actor_id': values['manager_id'],
+             'payload': {'user_ids': executor_ids}}
+            for task_id, (_, values, executor_ids) in zip(task_ids, batch) if executor_ids
+        ])
+    return task_ids
+
+
+def detect_format(filename=None, content_type=None):
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension in IMPORT_FORMATS:
+            return extension
+    if content_type:
+        if 'json' in content_type:
+            return 'json'
+        if 'csv' in content_type:
+            return 'csv'
+    return None
+
+
+@tasks_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--manager', 'manager_email', required=True, help='Email менеджера импортируемых задач.')
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='Формат файла (по умолчанию - по расширению).')
+@click.option('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Задач в одной вставке.')
+def import_command(path, manager_email, fmt, batch_size):
+    """Импортирует задачи из JSON или CSV файла."""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Не удалось определить формат, укажите --format')
+
+    manager = User.query.filter_by(email=manager_email).first()
+    if manager is None:
+        raise click.ClickException(f'Пользователь {manager_email} не найден')
+
+    with open(path, 'rb') as f:
+        try:
+            rows = parse_rows(f.read(), fmt)
+        except ImportFormatError as e:
+            raise click.ClickException(str(e))
+
+    result = import_tasks(rows, manager.id, batch_size=batch_size)
+    for error in result['errors']:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+    click.echo(f"Imported {result['created']} tasks, {len(result['errors'])} rows skipped")
+
+
+def init_app(app):
+    app.cli.add_command(tasks_cli)
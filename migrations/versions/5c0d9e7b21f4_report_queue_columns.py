@@ -0,0 +1,28 @@
+"""report queue columns
+
+Revision ID: 5c0d9e7b21f4
+Revises: a31976740eb9
+Create Date: 2026-10-18 05:31:02.418773
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c0d9e7b21f4'
+down_revision = 'a31976740eb9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('started_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('started_at')
@@ -0,0 +1,107 @@
+"""full text search
+
+Revision ID: c7d3a1f0b9e2
+Revises: ef6862a758d6
+Create Date: 2026-10-18 06:10:12.518204
+
+Структуры поиска не описаны в моделях (см. app/search.py и include_object
+в migrations/env.py). PostgreSQL: вычисляемые колонки tsvector с GIN-индексом,
+их пересчитывает сама база при записи строки. SQLite: таблицы FTS5 и триггеры,
+которые обновляют индекс построчно.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d3a1f0b9e2'
+down_revision = 'ef6862a758d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("""
+            ALTER TABLE task ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+            ) STORED
+        """)
+        op.execute("""
+            ALTER TABLE comment ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('russian', content)
+            ) STORED
+        """)
+        op.create_index('ix_task_search', 'task', ['search_vector'], postgresql_using='gin')
+        op.create_index('ix_comment_search', 'comment', ['search_vector'], postgresql_using='gin')
+
+    elif dialect == 'sqlite':
+        # Токенизатор unicode61 не считает ё и е одной буквой, поэтому в индекс
+        # попадает текст с заменой ё -> е, а не содержимое исходных таблиц
+        op.execute("CREATE VIRTUAL TABLE task_fts USING fts5(title, description, tokenize='unicode61 remove_diacritics 2')")
+        op.execute("CREATE VIRTUAL TABLE comment_fts USING fts5(content, tokenize='unicode61 remove_diacritics 2')")
+
+        task_values = f"new.id, {_fold('new.title')}, {_fold('new.description')}"
+        comment_values = f"new.id, {_fold('new.content')}"
+        op.execute(f"""
+            CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN
+                INSERT INTO task_fts (rowid, title, description) VALUES ({task_values});
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN
+                DELETE FROM task_fts WHERE rowid = old.id;
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER task_fts_update AFTER UPDATE OF title, description ON task BEGIN
+                DELETE FROM task_fts WHERE rowid = old.id;
+                INSERT INTO task_fts (rowid, title, description) VALUES ({task_values});
+            END
+        """)
+
+        op.execute(f"""
+            CREATE TRIGGER comment_fts_insert AFTER INSERT ON comment BEGIN
+                INSERT INTO comment_fts (rowid, content) VALUES ({comment_values});
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER comment_fts_delete AFTER DELETE ON comment BEGIN
+                DELETE FROM comment_fts WHERE rowid = old.id;
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER comment_fts_update AFTER UPDATE OF content ON comment BEGIN
+                DELETE FROM comment_fts WHERE rowid = old.id;
+                INSERT INTO comment_fts (rowid, content) VALUES ({comment_values});
+            END
+        """)
+
+        # Индекс по уже существующим строкам
+        op.execute(f"INSERT INTO task_fts (rowid, title, description) "
+                   f"SELECT id, {_fold('title')}, {_fold('description')} FROM task")
+        op.execute(f"INSERT INTO comment_fts (rowid, content) SELECT id, {_fold('content')} FROM comment")
+
+
+def _fold(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.drop_index('ix_comment_search', table_name='comment')
+        op.drop_index('ix_task_search', table_name='task')
+        op.execute('ALTER TABLE comment DROP COLUMN search_vector')
+        op.execute('ALTER TABLE task DROP COLUMN search_vector')
+
+    elif dialect == 'sqlite':
+        for trigger in ('task_fts_insert', 'task_fts_delete', 'task_fts_update',
+                        'comment_fts_insert', 'comment_fts_delete', 'comment_fts_update'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS comment_fts')
+        op.execute('DROP TABLE IF EXISTS task_fts')